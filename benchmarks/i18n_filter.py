@@ -0,0 +1,93 @@
+"""Microbenchmark of rendering templates without translatable content, with
+and without the i18n filter attached. Usage::
+
+    python benchmarks/i18n_filter.py
+    python benchmarks/i18n_filter.py --repeat 30
+
+Rendering is timed without a web application, as the cost of a filter pass
+is small compared to noise of whole requests. The best time of each case is
+reported
+
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+import os
+import sys
+import argparse
+import timeit
+
+from genshi.filters import Translator
+from genshi.template import MarkupTemplate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from pyramid_genshi import RenderOptions  # noqa
+from pyramid_genshi import is_translatable  # noqa
+
+XMLNS = (
+    'xmlns="http://www.w3.org/1999/xhtml" '
+    'xmlns:py="http://genshi.edgewall.org/"'
+)
+
+TABLE_ROWS = 1000
+TABLE_COLUMNS = 10
+
+CASES = [
+    (
+        'simple',
+        '<div %s>\n${ name }\n</div>' % XMLNS,
+        dict(name='foobar'),
+        2000,
+    ),
+    (
+        'large_table',
+        '<table %s>\n'
+        '<tr py:for="row in rows">'
+        '<td py:for="cell in row" class="cell">${ cell }</td>'
+        '</tr>\n'
+        '</table>' % XMLNS,
+        dict(rows=[
+            ['cell %s-%s' % (row, column) for column in range(TABLE_COLUMNS)]
+            for row in range(TABLE_ROWS)
+        ]),
+        3,
+    ),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-r', '--repeat', type=int, default=15,
+                        help='number of rounds, the best one is reported')
+    args = parser.parse_args(argv)
+    options = RenderOptions.from_settings({})
+    for name, source, values, number in CASES:
+        templates = {}
+        for attached in [True, False]:
+            tmpl = MarkupTemplate(source)
+            translator = Translator()
+            assert not is_translatable(tmpl._stream, translator)
+            if attached:
+                translator.setup(tmpl)
+            templates[attached] = tmpl
+
+        best = {}
+        # notice: rounds of both cases are interleaved, so that they are
+        # affected by noise of the machine equally
+        for _ in range(args.repeat):
+            for attached, tmpl in templates.items():
+                elapsed = timeit.timeit(
+                    lambda: options.serialize(tmpl.generate(**values)),
+                    number=number,
+                ) / number
+                best[attached] = min(best.get(attached, elapsed), elapsed)
+        print('%-12s %9.3f ms with filter  %9.3f ms without  (%+.1f%%)' % (
+            name, best[True] * 1000, best[False] * 1000,
+            (best[False] / best[True] - 1) * 100,
+        ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
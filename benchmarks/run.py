@@ -0,0 +1,336 @@
+"""Benchmarks for render throughput and latency of pyramid_genshi
+
+Requests are made with WebTest against a minimal Pyramid application, so it
+runs offline. Usage::
+
+    python benchmarks/run.py
+    python benchmarks/run.py --number 500 simple large_table
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+    python benchmarks/run.py --setting genshi.i18n=false i18n
+    python benchmarks/run.py --threads 8 simple
+
+For each scenario, requests/sec, p50/p99 latency and peak memory allocated
+while rendering are reported, with ``--compare``, results worse than the
+baseline by more than ``--threshold`` are marked as regressions and the exit
+code is 1. With ``--threads``, requests are made from that many threads
+concurrently, for checking throughput scaling and lock contention.
+
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+import os
+import sys
+import gc
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+import webtest
+from pyramid.config import Configurator
+from pyramid.i18n import Localizer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import pyramid_genshi  # noqa
+
+XMLNS = (
+    'xmlns="http://www.w3.org/1999/xhtml" '
+    'xmlns:py="http://genshi.edgewall.org/" '
+    'xmlns:xi="http://www.w3.org/2001/XInclude" '
+    'xmlns:i18n="http://genshi.edgewall.org/i18n"'
+)
+
+INCLUDE_DEPTH = 10
+TABLE_ROWS = 1000
+TABLE_COLUMNS = 10
+I18N_MESSAGES = 200
+MEMORY_REQUESTS = 3
+
+
+def make_templates(tmp_dir):
+    """Write templates of all scenarios into tmp_dir
+
+    """
+    templates = {}
+    templates['simple.genshi'] = (
+        '<div %s>\n${ name }\n</div>' % XMLNS
+    )
+
+    for level in range(INCLUDE_DEPTH):
+        if level + 1 < INCLUDE_DEPTH:
+            body = '<xi:include href="./chain_%s.genshi" />' % (level + 1)
+        else:
+            body = '${ name }'
+        templates['chain_%s.genshi' % level] = (
+            '<div %s>level %s %s</div>' % (XMLNS, level, body)
+        )
+
+    messages = '\n'.join(
+        '<p>Message number %s</p>' % i for i in range(I18N_MESSAGES)
+    )
+    calls = '\n'.join(
+        "<span>${ _('Dynamic message %s') }</span>" % i
+        for i in range(I18N_MESSAGES // 2)
+    )
+    templates['i18n.genshi'] = '<div %s>\n%s\n%s\n</div>' % (
+        XMLNS, messages, calls,
+    )
+
+    templates['large_table.genshi'] = (
+        '<table %s>\n'
+        '<tr py:for="row in rows">'
+        '<td py:for="cell in row" class="cell">${ cell }</td>'
+        '</tr>\n'
+        '</table>' % XMLNS
+    )
+
+    for filename, content in templates.items():
+        with open(os.path.join(tmp_dir, filename), 'wt') as tmpl_file:
+            tmpl_file.write(content)
+
+
+class Translations(object):
+    """Dummy gettext translations which upper-cases messages
+
+    """
+
+    def ugettext(self, message):
+        return message.upper()
+    gettext = ugettext
+
+    def ungettext(self, singular, plural, n):
+        return (singular if n == 1 else plural).upper()
+    ngettext = ungettext
+
+
+def make_app(tmp_dir, template, values, settings=None):
+    """Make a WebTest app renders template with values for path /
+
+    """
+    config = Configurator(settings=settings or {})
+    config.include('pyramid_genshi')
+
+    def view(request):
+        request.localizer = Localizer('xx', Translations())
+        return dict(values)
+
+    config.add_view(view, renderer=os.path.join(tmp_dir, template))
+    return webtest.TestApp(config.make_wsgi_app())
+
+
+SCENARIOS = {
+    'cold_compile': (
+        'large_table.genshi',
+        dict(rows=[['x'] * TABLE_COLUMNS] * 10),
+        True,
+    ),
+    'simple': ('simple.genshi', dict(name='foobar'), False),
+    'include_chain': ('chain_0.genshi', dict(name='foobar'), False),
+    'i18n': ('i18n.genshi', {}, False),
+    'large_table': (
+        'large_table.genshi',
+        dict(rows=[
+            ['cell %s-%s' % (row, column) for column in range(TABLE_COLUMNS)]
+            for row in range(TABLE_ROWS)
+        ]),
+        False,
+    ),
+}
+
+
+def percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def make_requests(apps, threads=1):
+    """Make a request to each app from given number of threads, return
+    (total seconds, list of latencies)
+
+    """
+    latencies = []
+
+    def worker(worker_apps):
+        for app in worker_apps:
+            request_begin = default_timer()
+            app.get('/')
+            latencies.append(default_timer() - request_begin)
+
+    workers = [
+        threading.Thread(target=worker, args=(apps[index::threads], ))
+        for index in range(threads)
+    ]
+    begin = default_timer()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return default_timer() - begin, latencies
+
+
+def run_scenario(tmp_dir, name, number, settings=None, threads=1):
+    """Run a scenario for number of requests, return a dict of results
+
+    """
+    template, values, cold = SCENARIOS[name]
+    if cold:
+        # every request is made to a new app, so that templates are always
+        # compiled from scratch
+        apps = [
+            make_app(tmp_dir, template, values, settings)
+            for _ in range(number)
+        ]
+    else:
+        app = make_app(tmp_dir, template, values, settings)
+        # warm up
+        app.get('/')
+        apps = [app] * number
+
+    gc.collect()
+    total, latencies = make_requests(apps, threads)
+
+    # tracing allocations slows rendering down a lot, so that peak memory
+    # is measured separately with a few requests
+    peak = None
+    if tracemalloc is not None:
+        if cold:
+            apps = [make_app(tmp_dir, template, values, settings)
+                    for _ in range(MEMORY_REQUESTS)]
+        gc.collect()
+        tracemalloc.start()
+        for app in apps[:MEMORY_REQUESTS]:
+            app.get('/')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies.sort()
+    return dict(
+        rps=number / total,
+        p50_ms=percentile(latencies, 50) * 1000,
+        p99_ms=percentile(latencies, 99) * 1000,
+        peak_kib=peak / 1024.0 if peak is not None else None,
+    )
+
+
+def format_result(name, result, baseline=None, threshold=0.1):
+    """Format result as a line of the report, return (line, regressed)
+
+    """
+    columns = ['%-16s' % name]
+    regressed = False
+    for key, fmt, higher_is_better in [
+        ('rps', '%10.1f req/s', True),
+        ('p50_ms', '%9.3f ms p50', False),
+        ('p99_ms', '%9.3f ms p99', False),
+        ('peak_kib', '%10.1f KiB', False),
+    ]:
+        value = result[key]
+        if value is None:
+            columns.append('%14s' % 'n/a')
+            continue
+        column = fmt % value
+        base = (baseline or {}).get(key)
+        if base:
+            change = (value - base) / base
+            column += ' (%+.0f%%)' % (change * 100)
+            if (-change if higher_is_better else change) > threshold:
+                column += ' !'
+                regressed = True
+        columns.append(column)
+    return '  '.join(columns), regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='scenarios to run (default: all), available: '
+                             '%s' % ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('-n', '--number', type=int, default=200,
+                        help='number of requests per scenario')
+    parser.add_argument('-s', '--setting', action='append', default=[],
+                        metavar='KEY=VALUE',
+                        help='Pyramid setting for the app, e.g. '
+                             'genshi.i18n=false')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                        help='number of threads making requests')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save results as baseline into FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare results with baseline in FILE')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change counted as regression')
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or sorted(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error('unknown scenario %s' % name)
+
+    settings = {}
+    for setting in args.setting:
+        key, _, value = setting.partition('=')
+        settings[key.strip()] = value.strip()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    tmp_dir = tempfile.mkdtemp()
+    results = {}
+    regressions = []
+    try:
+        make_templates(tmp_dir)
+        for name in names:
+            number = args.number
+            if SCENARIOS[name][2]:
+                number = max(number // 10, 1)
+            results[name] = run_scenario(
+                tmp_dir, name, number, settings, args.threads,
+            )
+            line, regressed = format_result(
+                name, results[name], baseline.get(name), args.threshold,
+            )
+            print(line)
+            if regressed:
+                regressions.append(name)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.save:
+        try:
+            import pkg_resources
+            dist = pkg_resources.get_distribution('pyramid_genshi')
+            version = dist.version
+        except Exception:
+            version = 'unknown'
+        with open(args.save, 'wt') as baseline_file:
+            json.dump(dict(
+                version=version,
+                python=platform.python_version(),
+                number=args.number,
+                threads=args.threads,
+                settings=settings,
+                results=results,
+            ), baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+
+    if regressions:
+        print('Regressions: %s' % ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
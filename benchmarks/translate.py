@@ -0,0 +1,118 @@
+"""Microbenchmark of translating plain messages, with and without creating
+TranslationString objects. Usage::
+
+    python benchmarks/translate.py
+    python benchmarks/translate.py --number 200000
+
+For the ``_()`` function of templates and the gettext adaptor of the Genshi
+i18n filter, time per call and peak memory allocated temporarily by a call
+are reported for the TranslationString path and the plain message fast path
+
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+import os
+import sys
+import gc
+import argparse
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from pyramid.i18n import Localizer
+from pyramid.i18n import TranslationString
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from pyramid_genshi import GenshiTemplateRenderer  # noqa
+from pyramid_genshi import TranslationStringAdaptor  # noqa
+from pyramid_genshi import make_plain_translate  # noqa
+
+MESSAGES = ['Message number %s' % i for i in range(100)]
+
+
+class Translations(object):
+    """Dummy translations which supports dugettext like babel Translations
+
+    """
+
+    def __init__(self):
+        self.catalog = dict(
+            (message, message.upper()) for message in MESSAGES
+        )
+
+    def dugettext(self, domain, message):
+        return self.catalog.get(message, message)
+
+
+def make_cases():
+    """Return a list of (name, function translates a message)
+
+    """
+    localizer = Localizer('xx', Translations())
+    renderer = GenshiTemplateRenderer('benchmark.genshi', settings={})
+
+    def translation_string(message):
+        return localizer.translate(TranslationString(message, domain=None))
+
+    adaptor = TranslationStringAdaptor(localizer.translate)
+    fast_adaptor = TranslationStringAdaptor(
+        localizer.translate,
+        plain_translate=make_plain_translate(localizer),
+    )
+    return [
+        ('_() TranslationString', translation_string),
+        ('_() plain', renderer.make_translate(localizer)),
+        ('gettext TranslationString', adaptor.ugettext),
+        ('gettext plain', fast_adaptor.ugettext),
+    ]
+
+
+def run_case(func, number):
+    """Return (microseconds per call, bytes allocated per call)
+
+    """
+    count = number // len(MESSAGES)
+    gc.collect()
+    begin = default_timer()
+    for _ in range(count):
+        for message in MESSAGES:
+            func(message)
+    elapsed = default_timer() - begin
+
+    # peak memory allocated temporarily by a call, it requires Python 3.9+
+    allocated = None
+    if hasattr(tracemalloc, 'reset_peak'):
+        gc.collect()
+        tracemalloc.start()
+        total = 0
+        for message in MESSAGES:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(message)
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        allocated = total / float(len(MESSAGES))
+    return elapsed / (count * len(MESSAGES)) * 1000000, allocated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='number of calls per case')
+    args = parser.parse_args(argv)
+    for name, func in make_cases():
+        per_call, allocated = run_case(func, args.number)
+        print('%-28s %8.3f us/call  %8s bytes/call' % (
+            name, per_call,
+            '%.0f' % allocated if allocated is not None else 'n/a',
+        ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
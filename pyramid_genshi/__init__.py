@@ -1,18 +1,125 @@
 from __future__ import unicode_literals
+import io
 import os
+import gc
+import sys
+import pickle
+import hashlib
 import logging
 import gettext
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from collections import namedtuple
+from timeit import default_timer
 
 from pyramid.settings import asbool
+from pyramid.settings import aslist
+from pyramid.interfaces import IRendererFactory
 from pyramid.path import AssetResolver
+from pyramid.path import caller_package
+from pyramid.path import DottedNameResolver
+from pyramid.i18n import Localizer
 from pyramid.i18n import TranslationString
 from pyramid.i18n import get_localizer
+from pyramid.renderers import RendererHelper
 from pyramid.threadlocal import get_current_request
+from pyramid.threadlocal import manager
+from pyramid.threadlocal import get_current_registry
+import genshi
+from genshi.template import Context
+from genshi.template import MarkupTemplate
+from genshi.template import NewTextTemplate
 from genshi.template import TemplateLoader
+from genshi.template import TemplateNotFound
 from genshi.filters import Translator
+from genshi.compat import string_types
+from genshi.compat import text_type
+from genshi.core import Attrs
+from genshi.core import Markup
+from genshi.core import QName
+from genshi.core import COMMENT
+from genshi.core import END
+from genshi.core import END_NS
+from genshi.core import START
+from genshi.core import START_NS
+from genshi.core import TEXT
+from genshi.core import XML_NAMESPACE
+from genshi.filters.i18n import I18NDirective
+from genshi.output import get_serializer
+from genshi.template.base import DirectiveFactory
+from genshi.template.base import EXPR
+from genshi.template.base import INCLUDE
+from genshi.template.base import SUB
+from genshi.template.base import _apply_directives
+from genshi.template.base import _eval_expr
+from genshi.template.directives import Directive
+from genshi.template.interpolation import interpolate
+from translationstring import dugettext_policy
 
 logger = logging.getLogger(__name__)
 
+NOT_SET = object()
+
+# set as `request.genshi_cache_key` by a view for caching its response keyed
+# by the values it returns
+CACHE_BY_VALUES = object()
+
+TEXT_SETTINGS_PREFIX = 'genshi.text.'
+
+_localizer_translate = getattr(
+    Localizer.translate, '__func__', Localizer.translate)
+
+
+def is_text_class(template_class):
+    """Is template_class a text template class rather than a markup one
+
+    """
+    if template_class is None:
+        return False
+    return not issubclass(template_class, MarkupTemplate)
+
+
+def text_settings(settings):
+    """Make settings for text templates, ``genshi.text.*`` settings override
+    the corresponding ``genshi.*`` ones, and the output method is always text
+
+    """
+    result = dict(
+        (key, value) for key, value in settings.items()
+        if not key.startswith(TEXT_SETTINGS_PREFIX)
+    )
+    for key, value in settings.items():
+        if key.startswith(TEXT_SETTINGS_PREFIX):
+            result['genshi.' + key[len(TEXT_SETTINGS_PREFIX):]] = value
+    result['genshi.method'] = 'text'
+    result.pop('genshi.default_format', None)
+    result.pop('genshi.default_doctype', None)
+    return result
+
+
+def make_plain_translate(localizer):
+    """Make a function ``(msgid, domain)`` translates a plain message
+    without mapping and context with localizer, the same as
+    ``localizer.translate(TranslationString(msgid, domain=domain))``, but
+    without creating the `TranslationString`
+
+    Return None if localizer is not a Pyramid `Localizer` or its translate
+    method is overridden, as it may translate in another way
+
+    """
+    translate = getattr(localizer, 'translate', None)
+    if getattr(translate, '__func__', None) is not _localizer_translate:
+        return None
+    translations = localizer.translations
+    if translations is None:
+        return lambda msgid, domain=None: msgid
+
+    def plain_translate(msgid, domain=None):
+        return dugettext_policy(translations, msgid, domain, None)
+    return plain_translate
+
 
 class TranslationStringAdaptor(gettext.NullTranslations):
     """An adaptor provides gettext Translation interface for Genshi i18n filter,
@@ -21,7 +128,16 @@ class TranslationStringAdaptor(gettext.NullTranslations):
     
     """
     
-    def __init__(self, translate, pluralize=None, default_domain=None):
+    def __init__(
+        self,
+        translate,
+        pluralize=None,
+        default_domain=None,
+        cache=None,
+        locale_name=None,
+        catalog=None,
+        plain_translate=None,
+    ):
         """translate is the function to be called with a TranslationString
         argument and return translated string
         
@@ -30,17 +146,41 @@ class TranslationStringAdaptor(gettext.NullTranslations):
             (singular, plural, n, domain=None, mapping=None)
         
         for pluralize message
+
+        cache is an optional `TranslationCache` for memoizing translated
+        messages of locale_name
+
+        catalog is the translations object behind translate, templates
+        pre-translated for locale_name are rebuilt when it changes
+
+        plain_translate is an optional function made by
+        `make_plain_translate`, for translating messages without creating
+        TranslationString
         
         """
         gettext.NullTranslations.__init__(self)
         self.translate = translate
         self.pluralize = pluralize
         self.default_domain = default_domain
+        self.cache = cache
+        self.locale_name = locale_name
+        self.catalog = catalog
+        self.plain_translate = plain_translate
         
     def ugettext(self, message, domain=None):
         if domain is None:
             domain = self.default_domain
-        tmsg = self.translate(TranslationString(message, domain=domain))
+        if self.cache is not None:
+            key = (self.locale_name, domain, message)
+            tmsg = self.cache.get(key)
+            if tmsg is not None:
+                return tmsg
+        if self.plain_translate is not None:
+            tmsg = self.plain_translate(message, domain)
+        else:
+            tmsg = self.translate(TranslationString(message, domain=domain))
+        if self.cache is not None:
+            self.cache.set(key, tmsg)
         return tmsg
 
     def dugettext(self, domain, message):
@@ -50,7 +190,14 @@ class TranslationStringAdaptor(gettext.NullTranslations):
         if domain is None:
             domain = self.default_domain
         if self.pluralize is not None:
+            if self.cache is not None:
+                key = (self.locale_name, domain, msgid1, msgid2, n)
+                tmsg = self.cache.get(key)
+                if tmsg is not None:
+                    return tmsg
             tmsg = self.pluralize(msgid1, msgid2, n, domain=domain)
+            if self.cache is not None:
+                self.cache.set(key, tmsg)
             return tmsg
         if n == 1:
             return msgid1
@@ -60,16 +207,1767 @@ class TranslationStringAdaptor(gettext.NullTranslations):
     def dungettext(self, domain, msgid1, msgid2, n):
         return self.ungettext(msgid1, msgid2, n, domain)
 
+    # Genshi calls these under Python 3
+    def gettext(self, message):
+        return self.ugettext(message)
+
+    def dgettext(self, domain, message):
+        return self.ugettext(message, domain)
+
+    def ngettext(self, msgid1, msgid2, n):
+        return self.ungettext(msgid1, msgid2, n)
+
+    def dngettext(self, domain, msgid1, msgid2, n):
+        return self.ungettext(msgid1, msgid2, n, domain)
+
+
+class TranslationCache(object):
+    """Bounded cache of translated messages shared by all renders, keyed by
+    (locale_name, domain, msgid) or (locale_name, domain, msgid1, msgid2, n)
+    for plural messages
+
+    Messages of a locale are invalidated automatically when the translations
+    (catalog) object of its localizer is replaced, call `invalidate` if
+    catalogs are reloaded in place. Cache hits do not acquire any lock, so
+    the hits and misses counters are only approximate under threads
+
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._catalogs = {}
+        self._lock = threading.Lock()
+
+    def bind(self, localizer):
+        """Make sure cached messages of the localizer's locale are translated
+        by its current translations object, invalidate them otherwise
+
+        """
+        locale_name = localizer.locale_name
+        translations = getattr(localizer, 'translations', None)
+        if self._catalogs.get(locale_name, translations) is not translations:
+            self.invalidate(locale_name)
+        self._catalogs[locale_name] = translations
+
+    def get(self, key):
+        tmsg = self._cache.get(key)
+        if tmsg is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return tmsg
+
+    def set(self, key, tmsg):
+        with self._lock:
+            self._cache[key] = tmsg
+            # discard the oldest messages
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, locale_name=None):
+        """Discard cached messages of given locale, or all messages if
+        locale_name is None
+
+        """
+        with self._lock:
+            if locale_name is None:
+                self._cache.clear()
+                self._catalogs.clear()
+                return
+            for key in list(self._cache):
+                if key[0] == locale_name:
+                    del self._cache[key]
+            self._catalogs.pop(locale_name, None)
+
+    def stats(self):
+        """Return a dict of size, hits and misses of the cache
+
+        """
+        return dict(
+            size=len(self._cache),
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+
+class ContextTranslator(Translator):
+    """Genshi i18n filter which translates with the gettext translations
+    object passed as ``_i18n.translations`` in the template context, so that
+    each render can use the localizer of its own request, falls back to the
+    translations object given to the constructor
+
+    """
+
+    def __call__(self, stream, ctxt=None, **kwargs):
+        translations = None
+        if ctxt is not None:
+            translations = ctxt.get('_i18n.translations')
+        if translations is None:
+            return Translator.__call__(self, stream, ctxt, **kwargs)
+        translator = Translator(
+            translations,
+            ignore_tags=self.ignore_tags,
+            include_attrs=self.include_attrs,
+            extract_text=self.extract_text,
+        )
+        return translator(stream, ctxt, **kwargs)
+
+
+class LocaleVariants(object):
+    """Template filter takes the place of the i18n filter of a template, it
+    renders with a copy of the template stream pre-translated for the locale
+    of ``_i18n.translations`` in the context, which is made when the locale
+    is rendered at the first time, and made again when the catalog of the
+    locale is replaced
+
+    Static text and attributes are translated in advance, only i18n
+    directives (``i18n:msg`` and the like) are still translated when
+    rendering. Without translations for a locale in the context, it falls
+    back to translating with the i18n filter as usual
+
+    """
+
+    def __init__(self, template, translator, fold=False):
+        self.template = template
+        self.translator = translator
+        self.fold = fold
+        # locale name -> (catalog, pre-translated stream)
+        self.variants = {}
+
+    def get_variant(self, translations):
+        """Get stream of the template pre-translated with translations
+
+        """
+        locale_name = translations.locale_name
+        catalog = getattr(translations, 'catalog', None)
+        variant = self.variants.get(locale_name)
+        if variant is not None and variant[0] is catalog:
+            return variant[1]
+        translator = self.translator
+        stream = list(Translator(
+            translations,
+            ignore_tags=translator.ignore_tags,
+            include_attrs=translator.include_attrs,
+            extract_text=translator.extract_text,
+        )(self.template.stream, Context()))
+        if self.fold:
+            # text and attributes are static now
+            stream = fold_static(stream)
+        self.variants[locale_name] = catalog, stream
+        return stream
+
+    def __call__(self, stream, ctxt=None, **vars):
+        translations = None
+        if ctxt is not None:
+            translations = ctxt.get('_i18n.translations')
+        if getattr(translations, 'locale_name', None) is None:
+            return self.translator(stream, ctxt, **vars)
+        translator = self.translator
+        # notice: the translator still sets up gettext functions in the
+        # context for i18n directives
+        translator = Translator(
+            translations,
+            ignore_tags=translator.ignore_tags,
+            include_attrs=translator.include_attrs,
+            extract_text=False,
+        )
+        return translator(iter(self.get_variant(translations)), ctxt, **vars)
+
+
+class TemplateRendered(object):
+    """An event sent when a template is rendered with instrumentation enabled
+    (the ``genshi.instrumentation`` setting), subscribe it with ::
+
+        config.add_subscriber(subscriber, TemplateRendered)
+
+    Times are in seconds, `generate_time` is None for streaming responses,
+    as generating and serializing are interleaved, `serialize_time` includes
+    both in that case
+
+    """
+
+    def __init__(
+        self,
+        path,
+        request,
+        cache_hit,
+        load_time,
+        generate_time,
+        serialize_time,
+        size,
+    ):
+        self.path = path
+        self.request = request
+        self.cache_hit = cache_hit
+        self.load_time = load_time
+        self.generate_time = generate_time
+        self.serialize_time = serialize_time
+        self.size = size
+
+
+class RenderStats(object):
+    """Aggregated load and render statistics per template path
+
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _get(self, path):
+        stats = self._templates.get(path)
+        if stats is None:
+            stats = self._templates.setdefault(path, dict(
+                hits=0,
+                misses=0,
+                load_time=0.0,
+                renders=0,
+                generate_time=0.0,
+                serialize_time=0.0,
+                bytes=0,
+            ))
+        return stats
+
+    def record_load(self, path, seconds, hit):
+        with self._lock:
+            stats = self._get(path)
+            if hit:
+                stats['hits'] += 1
+            else:
+                stats['misses'] += 1
+            stats['load_time'] += seconds
+
+    def record_render(self, path, generate_time, serialize_time, size):
+        with self._lock:
+            stats = self._get(path)
+            stats['renders'] += 1
+            stats['generate_time'] += generate_time or 0.0
+            stats['serialize_time'] += serialize_time
+            stats['bytes'] += size
+
+    def snapshot(self):
+        """Return a dict maps template path to a dict of its hits, misses,
+        load_time, renders, generate_time, serialize_time and bytes, times
+        are total seconds
+
+        """
+        with self._lock:
+            return dict(
+                (path, dict(stats))
+                for path, stats in self._templates.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._templates.clear()
+
+
+class CompiledTemplateCache(object):
+    """On-disk cache of parsed and compiled templates, so that processes can
+    share the work and start fast after restarting, templates are keyed by
+    path, modification time, template class, encoding and versions of Genshi
+    and Python
+
+    Cached templates are unpickled, so that the cache directory should only
+    be writable by the application itself
+
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # created by another process in the meantime
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def _cache_path(self, cls, filepath, mtime, encoding):
+        key = repr((
+            filepath,
+            mtime,
+            cls.__module__,
+            cls.__name__,
+            encoding,
+            genshi.__version__,
+            sys.version,
+        ))
+        digest = hashlib.sha1(key.encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.pickle')
+
+    def get(self, cls, filepath, mtime, encoding, loader):
+        """Get cached template, return None if it's not cached
+
+        """
+        cache_path = self._cache_path(cls, filepath, mtime, encoding)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                state = pickle.load(cache_file)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            logger.warning('Failed to load compiled template %s from %s',
+                           filepath, cache_path, exc_info=True)
+            return None
+        tmpl = cls.__new__(cls)
+        tmpl.__setstate__(state)
+        tmpl.loader = loader
+        return tmpl
+
+    def set(self, tmpl, mtime, encoding):
+        """Write template into the cache, it should be called before the
+        template is prepared (rendered) and set up by loader callback
+
+        """
+        cache_path = self._cache_path(
+            type(tmpl), tmpl.filepath, mtime, encoding,
+        )
+        state = tmpl.__getstate__()
+        state['loader'] = None
+        tmp_path = '%s.%s.tmp' % (cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as cache_file:
+                pickle.dump(state, cache_file, pickle.HIGHEST_PROTOCOL)
+            # atomic, so that other processes never read a partial file
+            os.rename(tmp_path, cache_path)
+        except Exception:
+            logger.warning('Failed to write compiled template %s to %s',
+                           tmpl.filepath, cache_path, exc_info=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class MemoryFragmentCache(object):
+    """In-memory LRU backend of fragment cache
+
+    A fragment cache backend can be any object provides ``get(key)``, which
+    returns None if the key is missing or expired, and ``set(key, value,
+    ttl)``, where ttl is in seconds or None for never expiring, keys are
+    tuples of strings and values are strings
+
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._cache.pop(key, None)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.time():
+                return None
+            # put it back as the most recently used one
+            self._cache[key] = item
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = None
+        if ttl is not None:
+            expires = time.time() + ttl
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = expires, value
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def template_version(tmpl):
+    """Return a string identifies the version of a loaded template, made of
+    modification times of its file and files of templates it includes (as
+    far as the loader knows them)
+
+    """
+    filepath = tmpl.filepath
+    if filepath is None:
+        return ''
+    paths = set([filepath])
+    includes = getattr(tmpl.loader, 'includes', None)
+    if includes is not None:
+        paths.update(includes(filepath))
+    mtimes = []
+    for path in sorted(paths):
+        try:
+            mtimes.append(repr(os.path.getmtime(path)))
+        except OSError:
+            mtimes.append('')
+    return ','.join(mtimes)
+
+
+def _preserves_whitespace(stream):
+    """Determine are there elements whose whitespace is preserved by
+    serializers in stream (or its sub-streams), see `_UNFOLDABLE_TAGS`
+
+    """
+    xml_space = XML_NAMESPACE['space']
+    for kind, data, pos in stream:
+        if kind is SUB:
+            if _preserves_whitespace(data[1]):
+                return True
+        elif kind is START:
+            tag, attrs = data
+            if tag.localname.lower() in _UNFOLDABLE_TAGS:
+                return True
+            if xml_space in attrs:
+                return True
+    return False
+
+
+class FragmentDirective(Directive):
+    """Implementation of the ``cache:fragment`` directive, which caches the
+    rendered markup of its content by a key expression ::
+
+        <div cache:fragment="'nav-%s' % user.role">...</div>
+
+    or ::
+
+        <cache:fragment key="'footer'" ttl="300">...</cache:fragment>
+
+    The content is rendered (including ``xi:include``) into markup when the
+    key is missing, fragments are cached per template (and version of it, see
+    `template_version`), locale and output method. A None key disables
+    caching. ``py:match`` templates defined inside
+    a cached fragment are not registered when it's a cache hit
+
+    Fragments containing ``pre``, ``textarea``, ``script`` or ``style``
+    elements (or ``xml:space`` attributes) are never cached, as whitespace of
+    cached markup is not preserved by serializers
+
+    """
+    __slots__ = ['template', 'ttl', 'lineno', 'version', 'preserve']
+
+    def __init__(self, value, template=None, namespaces=None, lineno=-1,
+                 offset=-1, ttl=None, preserve=False):
+        Directive.__init__(self, value, template, namespaces, lineno, offset)
+        self.template = template
+        self.ttl = ttl
+        self.lineno = lineno
+        # version of the template, it's determined when it's first rendered
+        self.version = None
+        # is there whitespace to preserve in the content
+        self.preserve = preserve
+
+    @classmethod
+    def attach(cls, template, stream, value, namespaces, pos):
+        ttl = None
+        if type(value) is dict:
+            if value.get('ttl'):
+                ttl = float(value['ttl'])
+            value = value.get('key')
+        directive = cls(value, template, namespaces, *pos[1:], ttl=ttl,
+                        preserve=_preserves_whitespace(stream))
+        return directive, stream
+
+    def __call__(self, stream, directives, ctxt, **vars):
+        tmpl = self.template
+        fragment_cache = getattr(tmpl.loader, 'fragment_cache', None)
+        backend = getattr(fragment_cache, 'backend', None)
+        key = _eval_expr(self.expr, ctxt, vars)
+        stream = _apply_directives(stream, directives, ctxt, vars)
+        if backend is None or key is None or self.preserve:
+            return stream
+
+        options = ctxt.get('_genshi.render_options')
+        if options is not None:
+            method = options.method
+            serializer = options.fragment_serializer
+        else:
+            method = 'xml'
+            serializer = get_serializer(method)
+        # notice: the _ function translates even without the i18n filter, so
+        # the locale is part of the key anyway
+        locale_name = ctxt.get('_genshi.locale_name')
+        # notice: a reloaded template comes with new directives, so fragments
+        # of the previous version are not used
+        if self.version is None:
+            self.version = template_version(tmpl)
+        cachekey = (tmpl.filepath, self.version, key, locale_name, method)
+
+        markup = backend.get(cachekey)
+        if markup is None:
+            # apply rest of the template's own filters (flatten, match and
+            # include), so that the fragment can be serialized
+            for filter_ in tmpl.filters:
+                if getattr(filter_, '__self__', None) is tmpl:
+                    stream = filter_(stream, ctxt, **vars)
+            events = list(stream)
+            # notice: included templates could bring such elements in
+            if _preserves_whitespace(events):
+                # they would be matched again by match templates in effect
+                if not ctxt._match_templates:
+                    return events
+                return [(TEXT, Markup(''.join(serializer(events))),
+                         (tmpl.filepath, self.lineno, -1))]
+            markup = ''.join(serializer(events))
+            ttl = self.ttl
+            if ttl is None:
+                ttl = fragment_cache.default_ttl
+            backend.set(cachekey, markup, ttl)
+        return [(TEXT, Markup(markup), (tmpl.filepath, self.lineno, -1))]
+
+
+class FragmentCache(DirectiveFactory):
+    """Provides the ``cache:fragment`` directive (see `FragmentDirective`)
+    for templates, with a backend like `MemoryFragmentCache`, caching is
+    disabled if backend is None
+
+    """
+    NAMESPACE = 'https://github.com/fangpenlin/pyramid_genshi/cache'
+
+    directives = [('fragment', FragmentDirective)]
+
+    def __init__(self, backend=None, default_ttl=None):
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    @classmethod
+    def from_settings(cls, settings):
+        default_ttl = settings.get('genshi.fragment_cache_ttl')
+        if default_ttl is not None:
+            default_ttl = float(default_ttl)
+        if not asbool(settings.get('genshi.fragment_cache', True)):
+            return cls(None, default_ttl)
+        backend_factory = settings.get('genshi.fragment_cache_backend')
+        if backend_factory:
+            backend = DottedNameResolver().maybe_resolve(backend_factory)
+            return cls(backend(settings), default_ttl)
+        max_size = int(settings.get('genshi.fragment_cache_size', 1000))
+        return cls(MemoryFragmentCache(max_size), default_ttl)
+
+    def setup(self, template):
+        if hasattr(template, 'add_directives'):
+            template.add_directives(self.NAMESPACE, self)
+
+
+class StaticMarkup(object):
+    """A run of static events of a template folded by `fold_static`, it's
+    put into the template stream as an expression, which evaluates to the
+    run pre-serialized as `Markup` for the output method of the render
+
+    It evaluates to the original events instead if there are match templates
+    (``py:match``) in effect, so that they can still match elements of the
+    run, or if the output method is unknown (e.g. rendering without the
+    Pyramid renderer)
+
+    """
+    __slots__ = ['events', 'namespaces', 'markup']
+
+    #: element wraps the run when serializing it, for namespaces in scope
+    WRAPPER = QName('pyramid_genshi_static')
+
+    def __init__(self, events, namespaces):
+        self.events = events
+        self.namespaces = namespaces
+        # output method -> serialized markup
+        self.markup = {}
+
+    def evaluate(self, ctxt):
+        if ctxt._match_templates:
+            return self.events
+        options = ctxt.get('_genshi.render_options')
+        if options is None or options.method == 'text':
+            return self.events
+        markup = self.markup.get(options.method)
+        if markup is None:
+            markup = self.serialize(options.fragment_serializer)
+            self.markup[options.method] = markup
+        return markup
+
+    def serialize(self, serializer):
+        """Serialize the events with given serializer into `Markup`
+
+        """
+        pos = self.events[0][2]
+        stream = [(START_NS, ns, pos) for ns in self.namespaces]
+        # notice: the empty text events keep start tags from being turned
+        # into empty ones by the next end tag
+        stream.append((START, (self.WRAPPER, Attrs()), pos))
+        stream.append((TEXT, '', pos))
+        stream.extend(self.events)
+        stream.append((TEXT, '', pos))
+        stream.append((END, self.WRAPPER, pos))
+        text = ''.join(serializer(stream))
+        # strip the wrapper element
+        return Markup(text[text.index('>') + 1:text.rindex('<')])
+
+
+#: tags whose content is not folded, as serializers treat them specially
+_UNFOLDABLE_TAGS = frozenset(['pre', 'textarea', 'script', 'style'])
+
+
+def fold_static(stream, translator=None, min_events=2):
+    """Collapse runs of static events (tags with constant attributes, text
+    and comments) of a prepared template stream into `StaticMarkup`
+    expressions, return the folded stream
+
+    With a translator, text and attributes it would translate are kept as
+    they are. Content of ``pre``, ``textarea``, ``script`` and ``style``
+    elements, the first and last events of directives and anything under
+    i18n directives are never folded
+
+    """
+    include_attrs = frozenset()
+    translate_text = False
+    # notice: a translator without translations (genshi.i18n is off)
+    # translates nothing
+    if translator is not None and \
+            type(translator.translate) is not gettext.NullTranslations:
+        include_attrs = translator.include_attrs
+        translate_text = True
+    return _fold(list(stream), [], include_attrs, translate_text,
+                 min_events, False)
+
+
+def _fold(stream, namespaces, include_attrs, translate_text, min_events,
+          is_substream):
+    xml_lang = XML_NAMESPACE['lang']
+    xml_space = XML_NAMESPACE['space']
+    result = []
+    run = []
+    # (folded, preserved) of open elements
+    stack = []
+    preserved = [0]
+    last = len(stream) - 1
+    # namespaces are declared on the next start tag by serializers
+    declaring = False
+
+    def flush():
+        if len(run) >= min_events:
+            result.append(
+                (EXPR, StaticMarkup(list(run), list(namespaces)), run[0][2]),
+            )
+        else:
+            result.extend(run)
+        del run[:]
+
+    for index, event in enumerate(stream):
+        kind, data, pos = event
+        edge = is_substream and index in (0, last)
+        foldable = False
+        if kind is START:
+            tag, attrs = data
+            preserve = tag.localname.lower() in _UNFOLDABLE_TAGS
+            preserve = preserve or xml_lang in attrs or xml_space in attrs
+            foldable = not (edge or preserve or preserved[0] or declaring)
+            declaring = False
+            for name, value in attrs:
+                if not isinstance(value, string_types):
+                    foldable = False
+                elif name in include_attrs and value.strip():
+                    foldable = False
+            stack.append((foldable, preserve))
+            if preserve:
+                preserved[0] += 1
+        elif kind is END:
+            if stack:
+                foldable, preserve = stack.pop()
+                if preserve:
+                    preserved[0] -= 1
+            foldable = foldable and not edge
+        elif kind is TEXT or kind is COMMENT:
+            foldable = not (edge or preserved[0]) and (
+                kind is COMMENT or not translate_text or not data.strip()
+            )
+        if foldable:
+            run.append(event)
+            continue
+        flush()
+        if kind is SUB and not preserved[0]:
+            directives, substream = data
+            if not any(isinstance(d, I18NDirective) for d in directives):
+                substream = _fold(substream, namespaces, include_attrs,
+                                  translate_text, min_events, True)
+            event = (kind, (directives, substream), pos)
+        elif kind is START_NS:
+            namespaces.append(data)
+            declaring = True
+        elif kind is END_NS:
+            for i in range(len(namespaces) - 1, -1, -1):
+                if namespaces[i][0] == data:
+                    del namespaces[i]
+                    break
+        result.append(event)
+    flush()
+    return result
+
+
+class RenderCache(object):
+    """Bounded LRU cache of whole rendered (and encoded) responses, limited
+    by number of entries and total size of bodies, entries expire after ttl
+    seconds if it's not None
+
+    Each entry remembers the template it was rendered with, and it's
+    discarded if the template is reloaded since then
+
+    """
+
+    def __init__(self, max_size=1000, max_bytes=None, ttl=None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, template):
+        """Get cached body of key rendered with given template, return None
+        if there is no such body or it's expired
+
+        """
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry is not None:
+                expires, cached_template, body = entry
+                expired = expires is not None and expires < time.time()
+                if cached_template is template and not expired:
+                    # put it back as the most recently used one
+                    self._cache[key] = entry
+                    self.hits += 1
+                    return body
+                self.size_bytes -= len(body)
+            self.misses += 1
+            return None
+
+    def set(self, key, template, body):
+        size = len(body)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self.size_bytes -= len(old[2])
+            self._cache[key] = expires, template, body
+            self.size_bytes += size
+            while len(self._cache) > self.max_size or self._over_bytes():
+                _, (_, _, evicted) = self._cache.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+    def _over_bytes(self):
+        if self.max_bytes is None:
+            return False
+        return self.size_bytes > self.max_bytes
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        """Return a dict of size, bytes, hits and misses of the cache
+
+        """
+        return dict(
+            size=len(self._cache),
+            bytes=self.size_bytes,
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+
+def estimate_size(obj, _seen=None):
+    """Estimate memory used by a template (or a part of its stream) in
+    bytes, by walking its event stream, directives and compiled expressions
+
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += estimate_size(item, _seen)
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, _seen) + estimate_size(value, _seen)
+    elif hasattr(obj, 'filters') and hasattr(obj, '_stream'):
+        # a template
+        size += estimate_size(obj._stream, _seen)
+    elif hasattr(obj, 'code') and hasattr(obj, 'source'):
+        # an expression or suite
+        size += estimate_size(obj.source, _seen)
+        size += len(getattr(obj.code, 'co_code', b''))
+    elif isinstance(obj, StaticMarkup):
+        size += estimate_size(obj.events, _seen)
+    elif isinstance(obj, Directive):
+        expr = getattr(obj, 'expr', None)
+        if expr is not None:
+            size += estimate_size(expr, _seen)
+    return size
+
+
+XINCLUDE_INCLUDE = QName('http://www.w3.org/2001/XInclude}include')
+
+
+def _is_static_text(value):
+    """Is attribute value of a template static text (without expressions)
+
+    """
+    try:
+        parts = list(interpolate(value))
+    except Exception:
+        # notice: let Genshi report it when the template is prepared
+        return True
+    return all(kind is TEXT for kind, data, pos in parts)
+
+
+def is_translatable(stream, translator, includes=True):
+    """Determine does the stream of a loaded (not yet prepared) template have
+    anything to be translated by the i18n filter translator, that is static
+    text, static values of translatable attributes or i18n directives
+
+    If includes is True, a template with includes is always translatable, as
+    included templates are inlined into the stream (without auto reloading)
+
+    """
+    ignore_tags = translator.ignore_tags
+    include_attrs = translator.include_attrs
+    xml_lang = XML_NAMESPACE['lang']
+    skip = 0
+    for kind, data, pos in stream:
+        if kind is SUB:
+            # notice: directives of Genshi are not translated, but their
+            # substreams are
+            if is_translatable(data[1], translator, includes):
+                return True
+        elif kind is INCLUDE:
+            if includes:
+                return True
+        elif kind is START:
+            tag, attrs = data
+            if tag == XINCLUDE_INCLUDE and includes:
+                return True
+            if tag in Translator.NAMESPACE:
+                return True
+            for name, value in attrs:
+                if name in Translator.NAMESPACE:
+                    return True
+                if skip or name not in include_attrs:
+                    continue
+                if not isinstance(value, string_types):
+                    return True
+                if value.strip() and _is_static_text(value):
+                    return True
+            if skip or tag in ignore_tags or \
+                    isinstance(attrs.get(xml_lang), string_types):
+                skip += 1
+        elif kind is END:
+            if skip:
+                skip -= 1
+        elif kind is TEXT:
+            if not skip and data.strip():
+                return True
+    return False
+
+
+class _CacheEntry(object):
+    """A template cached by `AssetTemplateLoader`
+
+    """
+    __slots__ = ('template', 'uptodate', 'checked', 'size', 'depends')
+
+    def __init__(self, template, uptodate, checked, size=0, depends=None):
+        self.template = template
+        self.uptodate = uptodate
+        # last time we checked if the template file is up to date
+        self.checked = checked
+        # estimated memory used by the template in bytes
+        self.size = size
+        # absolute path -> modification time of all templates included by
+        # this one directly or indirectly, it's replaced instead of modified
+        self.depends = depends or {}
+
+
+class AssetTemplateLoader(TemplateLoader):
+    """Template loader which understands Pyramid asset specs, it is shared by
+    all renderers created by one `GenshiTemplateRendererFactory`, so that a
+    template (or a layout pulled in via ``xi:include``) is parsed and compiled
+    only once no matter how many views are using it
+
+    Templates are cached by resolved absolute path and template class, the
+    least recently used one is discarded when there are more than
+    `max_cache_size` templates in the cache, or when their estimated size
+    adds up to more than `max_cache_bytes` (if it's not None)
+
+    With `auto_reload`, modification time of a template file is checked at
+    most once every `check_interval` seconds when the template is loaded, or,
+    if `watch` is True, by a background thread every `check_interval`
+    seconds instead, so that loading never touches the file system
+
+    Static ``xi:include`` hrefs of loaded templates are recorded in an include
+    graph, a cached template is outdated if its file or the file of any
+    template it includes (directly or indirectly) is modified, and when a
+    template is discarded as outdated, templates including it are discarded
+    as well
+
+    """
+
+    def __init__(
+        self,
+        package=None,
+        translator=None,
+        auto_reload=False,
+        max_cache_size=100,
+        default_class=None,
+        translation_cache=None,
+        fragment_cache=None,
+        render_cache=None,
+        fold_static=False,
+        pretranslate=False,
+        skip_untranslatable=False,
+        check_interval=0,
+        watch=False,
+        stats=None,
+        cache_dir=None,
+        max_cache_bytes=None,
+    ):
+        TemplateLoader.__init__(
+            self,
+            auto_reload=auto_reload,
+            max_cache_size=max_cache_size,
+            default_class=default_class,
+            callback=self._tmpl_loaded,
+        )
+        self.package = package
+        self.translator = translator
+        self.translation_cache = translation_cache
+        self.fragment_cache = fragment_cache
+        self.render_cache = render_cache
+        self.fold_static = fold_static
+        self.pretranslate = pretranslate
+        self.skip_untranslatable = skip_untranslatable
+        self.max_cache_size = max_cache_size
+        self.max_cache_bytes = max_cache_bytes
+        # estimated memory used by cached templates
+        self.cache_bytes = 0
+        # templates discarded because the cache is full
+        self.evictions = 0
+        # templates discarded because their files are modified
+        self.reloads = 0
+        self.check_interval = check_interval
+        self.watch = watch
+        self.stats = stats
+        self.compiled_cache = None
+        if cache_dir:
+            self.compiled_cache = CompiledTemplateCache(cache_dir)
+        self._cache = OrderedDict()
+        # (asset spec, package) -> resolved absolute path
+        self._resolved = {}
+        # templates pinned by freeze
+        self._frozen = {}
+        self._watcher = None
+        # files checked with the template being rendered by each thread, so
+        # that its included templates are not checked again
+        self._verified = threading.local()
+        # absolute path -> set of absolute paths of templates it includes
+        self._includes = {}
+        # absolute path -> set of absolute paths of templates including it
+        self._included_by = {}
+        # absolute path -> modification time when the template was loaded
+        self._mtimes = {}
+
+    @classmethod
+    def from_settings(cls, settings, package=None, default_class=None):
+        """Create a loader (and its i18n translator) from Pyramid settings
+
+        If default_class is a text template class, the loader is for text
+        templates only, with ``genshi.text.*`` settings, no i18n filter and no
+        markup specific features
+
+        """
+        text = is_text_class(default_class)
+        if text:
+            settings = text_settings(settings)
+        default_domain = settings.get('genshi.default_domain')
+        auto_reload = asbool(settings.get('genshi.auto_reload', True))
+        max_cache_size = int(settings.get('genshi.max_cache_size', 100))
+        max_cache_bytes = settings.get('genshi.max_cache_bytes')
+        if max_cache_bytes:
+            max_cache_bytes = int(max_cache_bytes)
+        else:
+            max_cache_bytes = None
+        check_interval = float(
+            settings.get('genshi.reload_check_interval', 0))
+        watch = asbool(settings.get('genshi.reload_watcher', False))
+        stats = None
+        if asbool(settings.get('genshi.instrumentation', False)):
+            stats = RenderStats()
+        cache_dir = settings.get('genshi.cache_dir')
+        render_cache = None
+        if asbool(settings.get('genshi.render_cache', False)):
+            max_bytes = settings.get('genshi.render_cache_max_bytes')
+            ttl = settings.get('genshi.render_cache_ttl')
+            render_cache = RenderCache(
+                max_size=int(settings.get('genshi.render_cache_size', 1000)),
+                max_bytes=int(max_bytes) if max_bytes else None,
+                ttl=float(ttl) if ttl else None,
+            )
+
+        translation_cache_size = int(
+            settings.get('genshi.translation_cache_size', 10000))
+        translation_cache = None
+
+        # should we enable i18n?
+        i18n = asbool(settings.get('genshi.i18n', True))
+        if i18n:
+            # notice: the loader can be created without a request (for
+            # example, when warming templates at startup), so we look up the
+            # localizer when translating instead, this is only used when
+            # there is no translations object passed by the renderer
+            adaptor = TranslationStringAdaptor(
+                lambda *args, **kwargs: get_localizer(
+                    get_current_request()).translate(*args, **kwargs),
+                lambda *args, **kwargs: get_localizer(
+                    get_current_request()).pluralize(*args, **kwargs),
+                default_domain=default_domain
+            )
+            translator = ContextTranslator(adaptor)
+            if translation_cache_size > 0:
+                translation_cache = TranslationCache(translation_cache_size)
+        # no i18n available, just use translator with NullTranslations
+        else:
+            translator = Translator()
+        if text:
+            # notice: the i18n filter is for markup, text templates are
+            # translated with the _ function only
+            translator = None
+        return cls(
+            package=package,
+            translator=translator,
+            auto_reload=auto_reload,
+            max_cache_size=max_cache_size,
+            default_class=default_class,
+            translation_cache=None if text else translation_cache,
+            fragment_cache=None if text else FragmentCache.from_settings(
+                settings),
+            render_cache=render_cache,
+            fold_static=not text and asbool(
+                settings.get('genshi.fold_static', False)),
+            pretranslate=not text and i18n and asbool(
+                settings.get('genshi.pretranslate', False)),
+            skip_untranslatable=asbool(
+                settings.get('genshi.skip_untranslatable', True)),
+            check_interval=check_interval,
+            watch=watch,
+            stats=stats,
+            cache_dir=cache_dir,
+            max_cache_bytes=max_cache_bytes,
+        )
+
+    def _tmpl_loaded(self, tmpl):
+        """Called when a template is loadded by loader
+        
+        """
+        # notice: this must be the first one, as includes are inlined when
+        # the template is prepared without auto reloading
+        self._record_includes(tmpl)
+        if self.translator is not None:
+            if self.skip_untranslatable and not is_translatable(
+                tmpl._stream, self.translator, includes=not self.auto_reload,
+            ):
+                logger.debug('No i18n filter for untranslatable template %s',
+                             tmpl.filepath)
+            else:
+                self.translator.setup(tmpl)
+        if self.fragment_cache is not None:
+            self.fragment_cache.setup(tmpl)
+        # notice: this must be the last one, as it prepares the template
+        if self.fold_static and isinstance(tmpl, MarkupTemplate):
+            tmpl._stream = fold_static(tmpl.stream, self.translator)
+        if self.pretranslate and self.translator is not None and \
+                tmpl.filters and tmpl.filters[0] is self.translator:
+            tmpl.filters[0] = LocaleVariants(
+                tmpl,
+                self.translator,
+                fold=self.fold_static and isinstance(tmpl, MarkupTemplate),
+            )
+
+    def _record_includes(self, tmpl):
+        """Record templates included by tmpl in the include graph, includes
+        with dynamic hrefs are ignored, must be called with lock acquired
+
+        """
+        includes = set()
+        self._find_includes(tmpl._stream, tmpl.filepath, includes)
+        filepath = tmpl.filepath
+        for included in self._includes.get(filepath, ()):
+            self._included_by.get(included, set()).discard(filepath)
+        self._includes[filepath] = includes
+        for included in includes:
+            self._included_by.setdefault(included, set()).add(filepath)
+
+    def _find_includes(self, stream, filepath, includes):
+        for kind, data, pos in stream:
+            href = None
+            if kind is SUB:
+                self._find_includes(data[1], filepath, includes)
+            elif kind is INCLUDE:
+                # text templates
+                href, cls, fallback = data
+                if fallback:
+                    self._find_includes(fallback, filepath, includes)
+            elif kind is START and data[0] == XINCLUDE_INCLUDE:
+                # markup templates, XInclude elements are turned into INCLUDE
+                # events only when the template is prepared
+                href = data[1].get('href')
+            if not isinstance(href, string_types) or '$' in href:
+                continue
+            try:
+                includes.add(self.resolve(href, relative_to=filepath))
+            except (TemplateNotFound, ImportError, ValueError):
+                # notice: Genshi reports it (or uses the fallback) when the
+                # template is rendered
+                continue
+
+    def _walk_graph(self, graph, filepath):
+        """Return all paths reachable from filepath in graph (excluding
+        filepath itself)
+
+        """
+        found = set()
+        pending = [filepath]
+        while pending:
+            for path in graph.get(pending.pop(), ()):
+                if path not in found and path != filepath:
+                    found.add(path)
+                    pending.append(path)
+        return found
+
+    def includes(self, filename, relative_to=None):
+        """Return absolute paths of all templates included by the given
+        template directly or indirectly, only loaded templates are known
+
+        """
+        filepath = self.resolve(filename, relative_to)
+        with self._lock:
+            return self._walk_graph(self._includes, filepath)
+
+    def dependents(self, filename, relative_to=None):
+        """Return absolute paths of all loaded templates including the given
+        template directly or indirectly, they are discarded with it when it's
+        modified
+
+        """
+        filepath = self.resolve(filename, relative_to)
+        with self._lock:
+            return self._walk_graph(self._included_by, filepath)
+
+    def fan_in(self):
+        """Return a list of (absolute path, number of dependents) of included
+        templates, the most included one first
+
+        """
+        with self._lock:
+            result = [
+                (filepath, len(self._walk_graph(self._included_by, filepath)))
+                for filepath, included_by in self._included_by.items()
+                if included_by
+            ]
+        return sorted(result, key=lambda item: (-item[1], item[0]))
+
+    def _update_depends(self, filepath):
+        """Recompute modification times of included templates to be checked
+        for cached templates affected by loading filepath, must be called with
+        lock acquired
+
+        """
+        affected = self._walk_graph(self._included_by, filepath)
+        affected.add(filepath)
+        for cachekey, entry in self._cache.items():
+            if cachekey[0] not in affected:
+                continue
+            depends = {}
+            for path in self._walk_graph(self._includes, cachekey[0]):
+                mtime = self._mtimes.get(path)
+                if mtime is not None:
+                    depends[path] = mtime
+            entry.depends = depends
+
+    def _modified_files(self, cachekey, entry):
+        """Return absolute paths of modified files among the template file of
+        a cached entry and files of templates it includes
+
+        """
+        modified = set()
+        try:
+            if not entry.uptodate():
+                modified.add(cachekey[0])
+        except OSError:
+            modified.add(cachekey[0])
+        for filepath, mtime in entry.depends.items():
+            try:
+                if os.path.getmtime(filepath) == mtime:
+                    continue
+            except OSError:
+                pass
+            modified.add(filepath)
+        return modified
+
+    def _discard_outdated(self, filepaths):
+        """Discard cached templates of modified files and templates including
+        them, return discarded cache keys, must be called with lock acquired
+
+        """
+        filepaths = set(filepaths)
+        for filepath in list(filepaths):
+            filepaths.update(self._walk_graph(self._included_by, filepath))
+        discarded = [
+            cachekey for cachekey in self._cache if cachekey[0] in filepaths
+        ]
+        for cachekey in discarded:
+            self._forget(cachekey)
+            self.reloads += 1
+        return discarded
+
+    def _load_asset(self, filepath):
+        """Open the template file at given absolute path, return (fileobj,
+        mtime, uptodate)
+
+        """
+        fileobj = open(filepath, 'rb')
+        mtime = os.path.getmtime(filepath)
+
+        def _uptodate():
+            return mtime == os.path.getmtime(filepath)
+        return fileobj, mtime, _uptodate
+
+    def _instantiate_cached(self, cls, fileobj, filepath, mtime,
+                            encoding=None):
+        """Instantiate template, or get it from the on-disk compiled template
+        cache if it's enabled
+
+        """
+        if encoding is None:
+            encoding = self.default_encoding
+        compiled_cache = self.compiled_cache
+        if compiled_cache is not None:
+            tmpl = compiled_cache.get(cls, filepath, mtime, encoding, self)
+            if tmpl is not None:
+                return tmpl
+        # notice: filename of template should also be the absolute path, so
+        # that nested relative includes work properly
+        tmpl = self._instantiate(
+            cls, fileobj, filepath, filepath, encoding=encoding,
+        )
+        if compiled_cache is not None:
+            compiled_cache.set(tmpl, mtime, encoding)
+        return tmpl
+
+    def resolve(self, filename, relative_to=None):
+        """Resolve template filename to an absolute file path, filename can be
+        an absolute path, a Pyramid asset spec like ``package:path`` or a path
+        relative to the including template `relative_to`
+
+        """
+        if os.path.isabs(filename):
+            return os.path.normpath(filename)
+        if ':' in filename:
+            return self.resolve_asset(filename)
+        if relative_to and os.path.isabs(relative_to):
+            dirname = os.path.dirname(relative_to)
+            return os.path.normpath(os.path.join(dirname, filename))
+        raise TemplateNotFound(filename, [])
+
+    def resolve_asset(self, spec, package=None):
+        """Resolve asset spec relative to package (or package of the loader)
+        to an absolute path, resolved paths are memoized until the template
+        is reloaded
+
+        """
+        if package is None:
+            package = self.package
+        key = (spec, package)
+        filepath = self._resolved.get(key)
+        if filepath is None:
+            filepath = AssetResolver(package).resolve(spec).abspath()
+            self._resolved[key] = filepath
+        return filepath
+
+    def _forget(self, cachekey):
+        """Discard cached template and resolved asset paths of it, must be
+        called with lock acquired
+
+        """
+        entry = self._cache.pop(cachekey, None)
+        if entry is not None:
+            self.cache_bytes -= entry.size
+        filepath = cachekey[0]
+        for key, resolved in list(self._resolved.items()):
+            if resolved == filepath:
+                self._resolved.pop(key, None)
+
+    def load(self, filename, relative_to=None, cls=None, encoding=None):
+        """Load the template with given filename, see `resolve` for what kind
+        of filename is accepted
+
+        """
+        return self.fetch(filename, relative_to, cls, encoding)[0]
+
+    def fetch(self, filename, relative_to=None, cls=None, encoding=None):
+        """Same as `load`, but return a (template, cache_hit) tuple
+
+        Cache hits take no lock, only loading and reloading templates are
+        serialized by the lock of the loader
+
+        """
+        if cls is None:
+            cls = self.default_class
+        filepath = self.resolve(filename, relative_to)
+        cachekey = (filepath, cls)
+        included = relative_to is not None
+        if not included:
+            # notice: a new render begins, files checked with the previous
+            # one could be modified since then
+            self._verified.files = ()
+
+        tmpl = self._frozen.get(cachekey)
+        if tmpl is not None:
+            if self.stats is not None:
+                self.stats.record_load(filepath, 0, True)
+            return tmpl, True
+
+        entry = self._cache.get(cachekey)
+        if entry is not None and self._is_uptodate_safe(entry, included):
+            self._touch(cachekey, entry)
+            if self.stats is not None:
+                self.stats.record_load(filepath, 0, True)
+            return entry.template, True
+
+        with self._lock:
+            # notice: it could be loaded by others while we were waiting
+            entry = self._cache.get(cachekey)
+            if entry is not None:
+                if self._is_uptodate_safe(entry, included):
+                    if self.stats is not None:
+                        self.stats.record_load(filepath, 0, True)
+                    return entry.template, True
+                # notice: included templates could be modified instead, they
+                # should be reloaded as well, not only this one
+                self._discard_outdated(
+                    self._modified_files(cachekey, entry) or [filepath]
+                )
+
+            begin = default_timer()
+            try:
+                fileobj, mtime, uptodate = self._load_asset(filepath)
+            except (IOError, OSError):
+                raise TemplateNotFound(filename, [os.path.dirname(filepath)])
+            try:
+                tmpl = self._instantiate_cached(
+                    cls, fileobj, filepath, mtime, encoding=encoding,
+                )
+            finally:
+                fileobj.close()
+            if self.callback:
+                self.callback(tmpl)
+            # prepare (compile directives and inline includes) before
+            # publishing, as Genshi prepares templates lazily without lock
+            tmpl.stream
+            self._forget(cachekey)
+            entry = _CacheEntry(tmpl, uptodate, time.time(), 0)
+            # notice: estimating takes a good part of the loading time, so
+            # it's only done for the limit or instrumentation
+            if self._estimates_size():
+                entry.size = estimate_size(tmpl)
+            self._cache[cachekey] = entry
+            self.cache_bytes += entry.size
+            self._mtimes[filepath] = mtime
+            self._update_depends(filepath)
+            self._evict()
+            if self.auto_reload and self.watch:
+                self._start_watcher()
+            if self.stats is not None:
+                self.stats.record_load(
+                    filepath, default_timer() - begin, False,
+                )
+            return tmpl, False
+
+    def _evict(self):
+        """Discard least recently used templates until the cache is within
+        its limits, must be called with lock acquired
+
+        """
+        max_bytes = self.max_cache_bytes
+        while self._cache:
+            over_size = len(self._cache) > self.max_cache_size
+            over_bytes = False
+            # always keep the newest template, however big it is
+            if max_bytes is not None and len(self._cache) > 1:
+                over_bytes = self.cache_bytes > max_bytes
+            if not over_size and not over_bytes:
+                break
+            cachekey, entry = self._cache.popitem(last=False)
+            self.cache_bytes -= entry.size
+            self.evictions += 1
+            logger.debug('Evicted template %s (%s bytes)',
+                         cachekey[0], entry.size)
+
+    def _estimates_size(self):
+        """Determine are sizes of loaded templates estimated, they are when
+        `max_cache_bytes` is given or instrumentation is enabled
+
+        """
+        return self.max_cache_bytes is not None or self.stats is not None
+
+    def cache_stats(self):
+        """Return a dict of number of cached templates (size), their
+        estimated memory usage (bytes, None if sizes are not estimated, see
+        `_estimates_size`), limits, evictions and reloads
+
+        """
+        cache_bytes = None
+        if self._estimates_size():
+            cache_bytes = self.cache_bytes
+        return dict(
+            size=len(self._cache),
+            bytes=cache_bytes,
+            max_size=self.max_cache_size,
+            max_bytes=self.max_cache_bytes,
+            evictions=self.evictions,
+            reloads=self.reloads,
+        )
+
+    def _touch(self, cachekey, entry):
+        """Move a cached entry to the most recently used end of LRU, this is
+        skipped if the lock is taken by others, as it's only bookkeeping
+
+        """
+        if not self._lock.acquire(False):
+            return
+        try:
+            if self._cache.get(cachekey) is entry:
+                del self._cache[cachekey]
+                self._cache[cachekey] = entry
+        finally:
+            self._lock.release()
+
+    def _is_uptodate_safe(self, entry, included=False):
+        """Same as `_is_uptodate`, but return False if the template file is
+        gone
+
+        """
+        try:
+            return self._is_uptodate(entry, included)
+        except OSError:
+            return False
+
+    def _is_uptodate(self, entry, included=False):
+        """Determine is the cached entry up to date, only checks the file
+        system if check interval is passed
+
+        A template loaded with `included` (i.e. relative to another one) is
+        not checked if its file was checked with the template being rendered
+        by this thread, as files of all templates it includes were checked
+        as well
+
+        """
+        if not self.auto_reload:
+            return True
+        # the watcher removes outdated entries for us
+        if self.watch:
+            # notice: threads don't survive fork, a worker forked with
+            # preloaded templates may have never loaded one itself
+            watcher = self._watcher
+            if watcher is None or not watcher.is_alive():
+                with self._lock:
+                    self._start_watcher()
+            return True
+        if included:
+            if entry.template.filepath in getattr(self._verified, 'files', ()):
+                return True
+        now = time.time()
+        if now - entry.checked < self.check_interval:
+            return True
+        if not entry.uptodate():
+            return False
+        for path, mtime in entry.depends.items():
+            if os.path.getmtime(path) != mtime:
+                return False
+        entry.checked = now
+        if not included:
+            # notice: depends is replaced instead of modified, it's safe to
+            # keep it
+            self._verified.files = entry.depends
+        return True
+
+    def check_outdated(self):
+        """Check all cached templates and discard outdated ones (and cached
+        templates including them), return discarded cache keys
+
+        """
+        with self._lock:
+            entries = dict(self._cache)
+        outdated = []
+        for cachekey, entry in entries.items():
+            try:
+                uptodate = entry.uptodate()
+            except OSError:
+                uptodate = False
+            if not uptodate:
+                outdated.append(cachekey)
+        with self._lock:
+            # notice: it could be reloaded by others in the meantime
+            outdated = [
+                cachekey for cachekey in outdated
+                if self._cache.get(cachekey) is entries[cachekey]
+            ]
+            return self._discard_outdated(
+                [cachekey[0] for cachekey in outdated]
+            )
+
+    def _start_watcher(self):
+        """Start the watcher thread if it's not running, this is also the
+        case in a forked child process, must be called with lock acquired
+
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def watch():
+            interval = max(self.check_interval, 0.1)
+            while self.watch:
+                time.sleep(interval)
+                try:
+                    self.check_outdated()
+                except Exception:
+                    logger.exception('Failed to check outdated templates')
+
+        self._watcher = threading.Thread(
+            target=watch,
+            name='pyramid_genshi template watcher',
+        )
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def freeze(self):
+        """Pin all currently cached templates, they are never reloaded nor
+        evicted afterward, and loading them takes no lock and touches no LRU
+        bookkeeping, this is meant to be called in the master process before
+        forking workers, so that the templates are shared copy-on-write
+
+        """
+        with self._lock:
+            frozen = dict(self._frozen)
+            for cachekey, entry in self._cache.items():
+                frozen[cachekey] = entry.template
+            # notice: replace instead of updating it, so that readers
+            # without lock always see a complete dict
+            self._frozen = frozen
+        return len(frozen)
+
+    def clear(self):
+        """Discard all cached templates, including frozen ones
+
+        """
+        with self._lock:
+            self._cache.clear()
+            self.cache_bytes = 0
+            self._includes.clear()
+            self._included_by.clear()
+            self._mtimes.clear()
+            self._resolved.clear()
+            self._frozen = {}
+
+
+class RenderOptions(namedtuple('RenderOptions', [
+    'method',
+    'encoding',
+    'doctype',
+    'streaming',
+    'flush_size',
+    'serializer',
+    'errors',
+    'fragment_serializer',
+])):
+    """Immutable output options of renderers, resolved from settings once,
+    with pre-built serializer
+
+    """
+
+    @classmethod
+    def from_settings(cls, settings, template_class=None):
+        """Resolve options from settings, options of text templates are
+        resolved from ``genshi.text.*`` settings (see `text_settings`)
+
+        """
+        if is_text_class(template_class):
+            settings = text_settings(settings)
+        method = settings.get('genshi.method', 'html')
+        fmt = settings.get('genshi.default_format', method)
+        encoding = settings.get('genshi.default_encoding', 'utf8')
+        doctype = settings.get('genshi.default_doctype', None)
+        kwargs = {}
+        if doctype is not None:
+            kwargs['doctype'] = doctype
+        return cls(
+            method=fmt,
+            encoding=encoding,
+            doctype=doctype,
+            streaming=asbool(settings.get('genshi.streaming', False)),
+            flush_size=int(settings.get('genshi.streaming_flush_size', 8192)),
+            serializer=get_serializer(fmt, **kwargs),
+            errors='replace' if fmt == 'text' else 'xmlcharrefreplace',
+            # notice: fragments should not get doctype
+            fragment_serializer=get_serializer(fmt),
+        )
+
+    def encode(self, text):
+        """Encode serialized text with the output encoding
+
+        """
+        if not self.encoding:
+            return text
+        return text.encode(self.encoding, self.errors)
+
+    def serialize(self, stream):
+        """Serialize event stream and encode it with the output encoding
+
+        Serialized pieces are joined and encoded about `flush_size`
+        characters at a time into one growing buffer, so that the whole
+        document is never held as a list of pieces and a joined text string
+        besides the encoded body
+
+        """
+        pieces = self.serializer(stream)
+        if not self.encoding:
+            return ''.join(pieces)
+        encoding = self.encoding
+        errors = self.errors
+        flush_size = self.flush_size
+        output = io.BytesIO()
+        buf = []
+        size = 0
+        for piece in pieces:
+            buf.append(piece)
+            size += len(piece)
+            if size >= flush_size:
+                output.write(''.join(buf).encode(encoding, errors))
+                buf = []
+                size = 0
+        if buf:
+            output.write(''.join(buf).encode(encoding, errors))
+        return output.getvalue()
+
 
 class GenshiTemplateRendererFactory(object):
+    """Factory creates `GenshiTemplateRenderer` for Pyramid, all created
+    renderers share the same `AssetTemplateLoader`
+
+    Templates are loaded as template_class (`MarkupTemplate` by default), a
+    factory for text templates has its own loader and output options
+
+    """
+
+    def __init__(self, template_class=None):
+        self.template_class = template_class
+        self.loader = None
+        self.options = None
+        # thread pool for rendering asynchronously, see pyramid_genshi.aio
+        self.executor = None
+        self._lock = threading.Lock()
+        self._renderers = weakref.WeakSet()
+
+    def get_loader(self, settings):
+        """Get the shared loader, create it if it's not created yet
+
+        """
+        if self.loader is None:
+            with self._lock:
+                if self.loader is None:
+                    self.loader = AssetTemplateLoader.from_settings(
+                        settings, default_class=self.template_class,
+                    )
+        return self.loader
+
+    def find_templates(self, specs, package=None, extensions=('.genshi', )):
+        """Find all template files under given asset specs, spec can be a
+        template file or a directory which will be walked recursively
+
+        """
+        resolver = AssetResolver(package)
+        for spec in specs:
+            asset = resolver.resolve(spec)
+            path = asset.abspath()
+            if not asset.isdir():
+                yield path
+                continue
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(tuple(extensions)):
+                        yield os.path.join(dirpath, filename)
+
+    def warm(self, specs, settings, package=None, extensions=('.genshi', )):
+        """Load and compile all templates under given asset specs with the
+        shared loader, return a list of (path, seconds) tuples
+
+        """
+        loader = self.get_loader(settings)
+        timings = []
+        for path in self.find_templates(specs, package, extensions):
+            begin = default_timer()
+            loader.load(path)
+            elapsed = default_timer() - begin
+            logger.info('Warmed template %s in %.2f ms', path, elapsed * 1000)
+            timings.append((path, elapsed))
+        if len(timings) > loader.max_cache_size:
+            logger.warning(
+                'Warmed %s templates, but genshi.max_cache_size is only %s',
+                len(timings), loader.max_cache_size,
+            )
+        return timings
+
+    def get_options(self, settings):
+        """Get the shared `RenderOptions`, resolve it from settings if it's
+        not resolved yet
+
+        """
+        options = self.options
+        if options is None:
+            options = self.options = RenderOptions.from_settings(
+                settings, self.template_class,
+            )
+        return options
+
+    def refresh(self):
+        """Resolve output options from settings again for all renderers
+        created by this factory, call this after changing settings
+
+        """
+        self.options = None
+        for renderer in list(self._renderers):
+            renderer.refresh(self.get_options(renderer.settings))
+
     def __call__(self, info):
-        resolver = AssetResolver(info.package)
-        tmpl_path = resolver.resolve(info.name).abspath()
-        return GenshiTemplateRenderer(
+        loader = self.get_loader(info.settings)
+        tmpl_path = loader.resolve_asset(info.name, info.package)
+        renderer = GenshiTemplateRenderer(
             path=tmpl_path,
             settings=info.settings,
             package=info.package,
+            template_class=self.template_class,
+            loader=loader,
+            options=self.get_options(info.settings),
         )
+        self._renderers.add(renderer)
+        return renderer
 
 
 class GenshiTemplateRenderer(object):
@@ -80,6 +1978,8 @@ class GenshiTemplateRenderer(object):
         settings,
         package=None,
         template_class=None,
+        loader=None,
+        options=None,
     ):
         self.path = path
         self.settings = settings
@@ -87,60 +1987,92 @@ class GenshiTemplateRenderer(object):
         self.template_class = template_class
 
         self.default_domain = self.settings.get('genshi.default_domain')
-        auto_reload = asbool(self.settings.get('genshi.auto_reload', True))
-        self.loader = TemplateLoader(
-            self._load_asset,
-            callback=self._tmpl_loaded,
-            auto_reload=auto_reload,
-        )
-
-        # should we enable i18n?
-        i18n = asbool(self.settings.get('genshi.i18n', True))
-        if i18n:
-            self.adaptor = TranslationStringAdaptor(
-                self.localizer.translate,
-                self.localizer.pluralize,
-                default_domain=self.default_domain
+        self.i18n = asbool(self.settings.get('genshi.i18n', True))
+        if loader is None:
+            loader = AssetTemplateLoader.from_settings(
+                settings, package, default_class=template_class,
             )
-            self.translator = Translator(self.adaptor)
-        # no i18n available, just use translator with NullTranslations
-        else:
-            self.translator = Translator()
+        self.loader = loader
+        self.translator = loader.translator
+        self.refresh(options)
 
-    def _load_asset(self, filename):
-        """Load pyramid asset resource
+    def refresh(self, options=None):
+        """Set output options, or resolve them from settings again if options
+        is not given
 
         """
-        if ':' not in filename:
-            raise IOError('Not a asset style path')
-        resolver = AssetResolver(self.package)
-        filepath = resolver.resolve(filename).abspath()
-        fileobj = open(filepath, 'rt')
-        mtime = os.path.getmtime(filepath)
+        if options is None:
+            options = RenderOptions.from_settings(
+                self.settings, self.template_class,
+            )
+        self.options = options
 
-        def _uptodate():
-            return mtime == os.path.getmtime(filepath)
-        return filepath, filename, fileobj, _uptodate
+    def get_localizer(self, request=None):
+        """Get localizer of given request or current request, return None if
+        there is no request
+
+        """
+        if request is None:
+            request = get_current_request()
+        if request is None:
+            return None
+        return get_localizer(request)
 
     @property
     def localizer(self):
-        request = get_current_request()
-        localizer = get_localizer(request)
-        return localizer
+        return self.get_localizer()
+
+    def make_translate(self, localizer):
+        """Make the ``_`` function for templates, which translates with given
+        localizer
+
+        """
+        default_domain = self.default_domain
+        plain_translate = make_plain_translate(localizer)
+
+        def translate(*args, **kwargs):
+            # fast path for the common ``_('message')`` call
+            if plain_translate is not None and not kwargs and len(args) == 1:
+                if type(args[0]) is text_type:
+                    return plain_translate(args[0], default_domain)
+            kwargs.setdefault('domain', default_domain)
+            ts = TranslationString(*args, **kwargs)
+            if localizer is not None:
+                return localizer.translate(ts)
+            return ts
+        return translate
                 
     def translate(self, *args, **kwargs):
-        kwargs.setdefault('domain', self.default_domain)
-        ts = TranslationString(*args, **kwargs)
-        if self.localizer is not None:
-            return self.localizer.translate(ts)
-        return ts
-        
-    def _tmpl_loaded(self, tmpl):
-        """Called when a template is loadded by loader
-        
-        """
-        self.translator.setup(tmpl)
+        return self.make_translate(self.localizer)(*args, **kwargs)
+
+    def _prepare_values(self, values, localizer=NOT_SET):
+        """Resolve the localizer once for this render (unless it's given),
+        and set up translation functions in values with it
 
+        """
+        if localizer is NOT_SET:
+            localizer = self.get_localizer(values.get('request'))
+        values.setdefault('_', self.make_translate(localizer))
+        values['_genshi.render_options'] = self.options
+        values['_genshi.locale_name'] = getattr(
+            localizer, 'locale_name', None,
+        )
+        if self.i18n and self.translator is not None and \
+                localizer is not None:
+            cache = self.loader.translation_cache
+            if cache is not None:
+                cache.bind(localizer)
+            values.setdefault('_i18n.translations', TranslationStringAdaptor(
+                localizer.translate,
+                localizer.pluralize,
+                default_domain=self.default_domain,
+                cache=cache,
+                locale_name=localizer.locale_name,
+                catalog=getattr(localizer, 'translations', None),
+                plain_translate=make_plain_translate(localizer),
+            ))
+        return values
+        
     @property
     def template(self):
         """Loaded Genshi Template
@@ -156,16 +2088,277 @@ class GenshiTemplateRenderer(object):
         """Render template with values
         
         """
-        values.setdefault('_', self.translate)
+        if self.loader.stats is not None:
+            return self._render_instrumented(values)
+        options = self.options
+        self._prepare_values(values)
         stream = self.template.generate(**values)
-        method = self.settings.get('genshi.method', 'html')
-        fmt = self.settings.get('genshi.default_format', method)
-        encoding = self.settings.get('genshi.default_encoding', 'utf8')
-        doctype = self.settings.get('genshi.default_doctype', None)
-        kwargs = {}
-        if doctype is not None:
-            kwargs['doctype'] = doctype
-        body = stream.render(method=fmt, encoding=encoding, **kwargs)
+        return options.serialize(stream)
+
+    def render_async(self, **values):
+        """Render template with values in a thread pool executor, return an
+        awaitable of the encoded body, see `pyramid_genshi.aio` (Python 3.5+)
+
+        """
+        from pyramid_genshi import aio
+        return aio.render_template(self, values)
+
+    def iter_async(self, **values):
+        """Same as `render_iter`, but return an asynchronous iterator of
+        chunks, which are generated in a thread pool executor (Python 3.5+)
+
+        """
+        from pyramid_genshi import aio
+        return aio.iter_template(self, values)
+
+    def _load_timed(self):
+        """Load template, return (template, cache_hit, load_time)
+
+        """
+        begin = default_timer()
+        tmpl, hit = self.loader.fetch(
+            os.path.abspath(self.path),
+            cls=self.template_class,
+        )
+        return tmpl, hit, default_timer() - begin
+
+    def _instrument(self, tmpl, hit, load_time, generate_time,
+                    serialize_time, size, request):
+        """Record statistics of a render and notify `TemplateRendered`
+
+        """
+        self.loader.stats.record_render(
+            tmpl.filepath, generate_time, serialize_time, size,
+        )
+        if request is not None:
+            registry = request.registry
+        else:
+            registry = get_current_registry()
+        registry.notify(TemplateRendered(
+            path=tmpl.filepath,
+            request=request,
+            cache_hit=hit,
+            load_time=load_time,
+            generate_time=generate_time,
+            serialize_time=serialize_time,
+            size=size,
+        ))
+
+    def _render_instrumented(self, values):
+        """Render template with values, and record timing of each stage
+
+        """
+        self._prepare_values(values)
+        tmpl, hit, load_time = self._load_timed()
+        return self._render_timed(tmpl, hit, load_time, values)
+
+    def _render_timed(self, tmpl, hit, load_time, values):
+        """Render loaded template with prepared values, and record timing
+        of each stage
+
+        """
+        options = self.options
+        begin = default_timer()
+        # notice: we need to materialize the event stream, otherwise
+        # generating is interleaved with serializing
+        events = list(tmpl.generate(**values))
+        generated = default_timer()
+        body = options.serialize(events)
+        serialized = default_timer()
+        self._instrument(
+            tmpl, hit, load_time,
+            generated - begin, serialized - generated, len(body),
+            values.get('request'),
+        )
+        return body
+
+    def render_many(self, values_iter, localizer=NOT_SET, processes=None,
+                    chunksize=16, **common):
+        """Render template with each dict of values from values_iter, return
+        an iterator of encoded outputs in the same order, common values are
+        passed to every render, e.g. ::
+
+            renderer.render_many(
+                (dict(user=user) for user in users),
+                request=request,
+            )
+
+        The template, output options and localizer (of the request in
+        common values or current request, unless it's given) are resolved
+        once for the whole batch.
+
+        With processes, documents are rendered by a `multiprocessing.Pool`
+        of that many worker processes, chunksize dicts of values at a time,
+        each worker loads the template once with the settings of this
+        renderer. Values, common values and the localizer must be picklable,
+        the request is not passed to workers
+
+        """
+        if localizer is NOT_SET:
+            localizer = self.get_localizer(common.get('request'))
+        if processes:
+            common.pop('request', None)
+            return self._render_many_in_pool(
+                values_iter, localizer, processes, chunksize, common,
+            )
+        return self._render_many(values_iter, localizer, common)
+
+    def _render_many(self, values_iter, localizer, common):
+        options = self.options
+        stats = self.loader.stats
+        base = self._prepare_values(common, localizer)
+        tmpl, hit, load_time = self._load_timed()
+        for values in values_iter:
+            item = dict(base)
+            item.update(values)
+            if stats is not None:
+                yield self._render_timed(tmpl, hit, load_time, item)
+                hit, load_time = True, 0.0
+                continue
+            yield options.serialize(tmpl.generate(**item))
+
+    def _render_many_in_pool(self, values_iter, localizer, processes,
+                             chunksize, common):
+        import multiprocessing
+        pool = multiprocessing.Pool(
+            processes,
+            initializer=_init_batch_worker,
+            initargs=(
+                self.path,
+                dict(self.settings),
+                self.template_class,
+                localizer,
+                common,
+            ),
+        )
+        try:
+            for body in pool.imap(_render_batch_item, values_iter, chunksize):
+                yield body
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def render_iter(self, **values):
+        """Render template with values, return a generator yields encoded
+        chunks of output, each chunk is about `genshi.streaming_flush_size`
+        characters long
+        
+        """
+        options = self.options
+        flush_size = options.flush_size
+        self._prepare_values(values)
+        tmpl, hit, load_time = self._load_timed()
+        stream = tmpl.generate(**values)
+        stats = self.loader.stats
+        request = values.get('request')
+        # the generator is consumed by the WSGI server after Pyramid popped
+        # its thread locals, so we keep them and push them back while
+        # generating, to make get_current_request work in the template
+        threadlocals = manager.get()
+
+        def _iter_chunks():
+            serialized = options.serializer(stream)
+            buf = []
+            size = 0
+            total_size = 0
+            total_time = 0.0
+            while True:
+                manager.push(threadlocals)
+                begin = default_timer()
+                try:
+                    for piece in serialized:
+                        buf.append(piece)
+                        size += len(piece)
+                        if size >= flush_size:
+                            break
+                    else:
+                        serialized = None
+                    chunk = options.encode(''.join(buf))
+                    buf = []
+                    size = 0
+                finally:
+                    total_time += default_timer() - begin
+                    manager.pop()
+                if chunk:
+                    total_size += len(chunk)
+                    yield chunk
+                if serialized is None:
+                    break
+            if stats is not None:
+                manager.push(threadlocals)
+                try:
+                    self._instrument(
+                        tmpl, hit, load_time, None, total_time, total_size,
+                        request,
+                    )
+                finally:
+                    manager.pop()
+        return _iter_chunks()
+
+    def _use_streaming(self, system):
+        """Determine should we stream the response for the view, a view can
+        override the `genshi.streaming` setting by setting
+        `request.genshi_streaming`
+
+        """
+        request = system.get('request')
+        # only stream responses of views, not calls of pyramid.renderers.render
+        if request is None or system.get('view') is None:
+            return False
+        streaming = getattr(request, 'genshi_streaming', None)
+        if streaming is None:
+            return self.options.streaming
+        return asbool(streaming)
+
+    def _render_cache_key(self, value, system):
+        """Make key of the render cache for the view, return None if the
+        response should not be cached
+
+        Only responses of views opted in are cached, a view provides the key
+        by setting `request.genshi_cache_key`, or sets it to
+        `CACHE_BY_VALUES` for a key made of the values it returns (it's not
+        cached if they are not hashable). Notice that the template may render
+        anything of the request, so the key must cover what it renders
+
+        """
+        request = system.get('request')
+        key = getattr(request, 'genshi_cache_key', None)
+        if key is CACHE_BY_VALUES:
+            try:
+                key = frozenset(value.items())
+                hash(key)
+            except (AttributeError, TypeError):
+                return None
+        if key is None:
+            return None
+        # notice: the _ function translates even without the i18n filter
+        locale_name = None
+        if request is not None:
+            locale_name = get_localizer(request).locale_name
+        options = self.options
+        return (
+            self.path,
+            self.template_class,
+            locale_name,
+            options.method,
+            options.encoding,
+            options.doctype,
+            key,
+        )
+
+    def _render_cached(self, cache, value, system):
+        """Render with values, or return the cached body if there is one
+
+        """
+        key = self._render_cache_key(value, system)
+        if key is None:
+            return self.render(**system)
+        tmpl = self.template
+        body = cache.get(key, tmpl)
+        if body is None:
+            body = self.render(**system)
+            cache.set(key, tmpl, body)
         return body
     
     def __call__(self, value, system):
@@ -173,10 +2366,123 @@ class GenshiTemplateRenderer(object):
             system.update(value)
         except (TypeError, ValueError):
             raise ValueError('renderer was passed non-dictionary as value')
+        # notice: Pyramid before 1.6 sets anything returned as the body of
+        # request.response, so we set the app_iter ourselves and return None
+        # for leaving the response alone
+        if self._use_streaming(system):
+            response = system['request'].response
+            response.app_iter = self.render_iter(**system)
+            return None
+        cache = self.loader.render_cache
+        if cache is not None and system.get('view') is not None:
+            return self._render_cached(cache, value, system)
         result = self.render(**system)
         return result
 
 
+# renderer of a batch rendering worker process, and its arguments
+_batch_worker = None
+
+
+def _init_batch_worker(path, settings, template_class, localizer, common):
+    global _batch_worker
+    renderer = GenshiTemplateRenderer(
+        path=path,
+        settings=settings,
+        template_class=template_class,
+    )
+    _batch_worker = renderer, localizer, common
+
+
+def _render_batch_item(values):
+    renderer, localizer, common = _batch_worker
+    return next(renderer._render_many([values], localizer, dict(common)))
+
+
+def render_many(renderer_name, values_iter, request=None, package=None,
+                **kwargs):
+    """Same as `GenshiTemplateRenderer.render_many`, but look up the
+    renderer by name like `pyramid.renderers.render`, e.g. ::
+
+        for body in render_many('my_project:emails/welcome.genshi',
+                                (dict(user=user) for user in users)):
+            send(body)
+
+    """
+    if package is None:
+        package = caller_package()
+    helper = RendererHelper(name=renderer_name, package=package)
+    return helper.renderer.render_many(values_iter, request=request, **kwargs)
+
+
+def genshi_warm(config, *specs, **kwargs):
+    """Configuration directive loads and compiles all templates under given
+    asset specs when the configuration is committed, before the application
+    is served, e.g. ::
+
+        config.genshi_warm('my_project:templates/')
+
+    Template files are found by the `extensions` keyword argument, which
+    defaults to ``('.genshi', '.genshitxt')``, templates of each extension
+    are loaded by the renderer factory registered for it (or the ``.genshi``
+    one if there is none). Template files given directly go to the factory
+    of their extension, or the factory of the first extension
+
+    With ``freeze=True``, warmed templates are pinned in the loader (see
+    `AssetTemplateLoader.freeze`) and objects allocated so far are moved out
+    of the garbage collector's reach (``gc.freeze`` of Python 3.7+), so that
+    when the application is loaded before forking workers (e.g. gunicorn
+    ``--preload``), workers share the compiled templates copy-on-write
+
+    """
+    package = config.package
+    extensions = tuple(kwargs.get('extensions', ('.genshi', '.genshitxt')))
+    freeze = kwargs.get('freeze', False)
+
+    def warm():
+        registry = config.registry
+        resolver = AssetResolver(package)
+        # extension -> specs of directories and template files of it
+        routed = dict((extension, []) for extension in extensions)
+        for spec in specs:
+            if resolver.resolve(spec).isdir():
+                for extension in extensions:
+                    routed[extension].append(spec)
+                continue
+            matched = [ext for ext in extensions if spec.endswith(ext)]
+            routed[(matched or extensions)[0]].append(spec)
+
+        factories = []
+        for extension in extensions:
+            factory = registry.queryUtility(IRendererFactory, name=extension)
+            if factory is None:
+                factory = registry.getUtility(IRendererFactory, name='.genshi')
+            if routed[extension]:
+                factory.warm(routed[extension], registry.settings, package,
+                             (extension, ))
+            if factory not in factories:
+                factories.append(factory)
+        if freeze:
+            for factory in factories:
+                count = factory.loader.freeze()
+                logger.info('Froze %s templates', count)
+            # collect garbage before freezing, otherwise it's frozen as well
+            gc.collect()
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+    config.action(None, warm)
+
+
 def includeme(config):
     renderer_factory = GenshiTemplateRendererFactory()
     config.add_renderer('.genshi', renderer_factory)
+    config.add_renderer(
+        '.genshitxt', GenshiTemplateRendererFactory(NewTextTemplate),
+    )
+    config.add_directive('genshi_warm', genshi_warm)
+
+    settings = config.get_settings()
+    preload = aslist(settings.get('genshi.preload', ''))
+    if preload:
+        freeze = asbool(settings.get('genshi.preload_freeze', False))
+        config.genshi_warm(*preload, freeze=freeze)
@@ -0,0 +1,185 @@
+"""asyncio support, rendering is offloaded to a thread pool executor, so that
+it doesn't block the event loop, e.g. ::
+
+    from pyramid_genshi import aio
+
+    async def handle(request):
+        body = await aio.render('templates/index.genshi', values, request)
+        async for chunk in aio.render_iter('templates/big.genshi', values,
+                                           request):
+            await send(chunk)
+
+Functions here return awaitables (futures) instead of being coroutine
+functions. This module requires Python 3.5+, it can't be imported under
+Python 2
+
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from pyramid.interfaces import IRendererFactory
+from pyramid.path import caller_package
+from pyramid.renderers import RendererHelper
+from pyramid.threadlocal import get_current_registry
+from pyramid.threadlocal import manager
+
+
+def get_executor(registry=None):
+    """Get the executor for rendering shared by the Genshi renderer factory
+    of registry, it's created from settings at the first time
+
+    A `concurrent.futures.ThreadPoolExecutor` with `genshi.async_max_workers`
+    workers is created if the setting is given, otherwise None is returned,
+    which means the default executor of the event loop
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    factory = registry.queryUtility(IRendererFactory, name='.genshi')
+    if factory is None:
+        return None
+    if factory.executor is None:
+        settings = registry.settings or {}
+        max_workers = settings.get('genshi.async_max_workers')
+        if not max_workers:
+            return None
+        with factory._lock:
+            if factory.executor is None:
+                factory.executor = ThreadPoolExecutor(
+                    max_workers=int(max_workers),
+                )
+    return factory.executor
+
+
+def _get_threadlocals(request=None):
+    """Get thread locals to be pushed in the executor, for
+    `get_current_request` and `get_current_registry` there
+
+    """
+    if request is not None:
+        return dict(request=request, registry=request.registry)
+    return manager.get()
+
+
+def _call(threadlocals, func, *args, **kwargs):
+    manager.push(threadlocals)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        manager.pop()
+
+
+def _run(executor, threadlocals, func, *args, **kwargs):
+    """Call func with thread locals in executor, return a future of the
+    result
+
+    """
+    loop = asyncio.get_event_loop()
+    if executor is None:
+        executor = get_executor(threadlocals.get('registry'))
+    return loop.run_in_executor(
+        executor,
+        lambda: _call(threadlocals, func, *args, **kwargs),
+    )
+
+
+class AsyncChunks(object):
+    """Asynchronous iterator of encoded chunks, each chunk is generated in
+    the executor
+
+    `make_chunks` is a function returns an iterator of chunks, it's called
+    in the executor at the first iteration
+
+    """
+
+    def __init__(self, make_chunks, threadlocals, executor=None):
+        self.make_chunks = make_chunks
+        self.threadlocals = threadlocals
+        self.executor = executor
+        self._chunks = None
+
+    def _next(self):
+        if self._chunks is None:
+            self._chunks = iter(self.make_chunks())
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            # notice: StopIteration can't be raised through futures
+            raise StopAsyncIteration
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return _run(self.executor, self.threadlocals, self._next)
+
+
+def render_template(renderer, values, executor=None):
+    """Render values with a `GenshiTemplateRenderer` in executor, return a
+    future of the encoded body
+
+    """
+    threadlocals = _get_threadlocals(values.get('request'))
+    return _run(executor, threadlocals, renderer.render, **values)
+
+
+def iter_template(renderer, values, executor=None):
+    """Render values with a `GenshiTemplateRenderer` in executor, return an
+    asynchronous iterator of encoded chunks (see
+    `GenshiTemplateRenderer.render_iter`)
+
+    """
+    threadlocals = _get_threadlocals(values.get('request'))
+    return AsyncChunks(
+        lambda: renderer.render_iter(**values),
+        threadlocals,
+        executor,
+    )
+
+
+def render(renderer_name, value, request=None, package=None, executor=None):
+    """Same as `pyramid.renderers.render`, but render in executor and return
+    a future of the rendered string
+
+    """
+    if package is None:
+        package = caller_package()
+    threadlocals = _get_threadlocals(request)
+    helper = RendererHelper(
+        name=renderer_name,
+        package=package,
+        registry=threadlocals.get('registry'),
+    )
+    return _run(
+        executor, threadlocals,
+        helper.render, value, None, request=request,
+    )
+
+
+def render_iter(renderer_name, value, request=None, package=None,
+                executor=None):
+    """Render with the Genshi template renderer_name in executor, return an
+    asynchronous iterator of encoded chunks
+
+    """
+    if package is None:
+        package = caller_package()
+    threadlocals = _get_threadlocals(request)
+    helper = RendererHelper(
+        name=renderer_name,
+        package=package,
+        registry=threadlocals.get('registry'),
+    )
+
+    def make_chunks():
+        renderer = helper.renderer
+        values = dict(
+            renderer_name=renderer_name,
+            renderer_info=helper,
+            context=getattr(request, 'context', None),
+            request=request,
+            req=request,
+        )
+        values.update(value)
+        return renderer.render_iter(**values)
+    return AsyncChunks(make_chunks, threadlocals, executor)
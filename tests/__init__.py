@@ -0,0 +1,32 @@
+from __future__ import unicode_literals
+
+
+class Translations(object):
+    """Fake gettext translations object backed by a catalog dict, messages
+    missing in the catalog are returned as they are, or upper-cased if upper
+    is True, looked up messages are recorded in `calls`
+
+    """
+
+    def __init__(self, catalog=None, upper=False):
+        self.catalog = catalog or {}
+        self.upper = upper
+        self.calls = []
+
+    def ugettext(self, message):
+        self.calls.append(message)
+        if message in self.catalog:
+            return self.catalog[message]
+        if self.upper:
+            return message.upper()
+        return message
+    gettext = ugettext
+
+
+# catalogs of the same messages in a few locales
+CATALOGS = {
+    'es': {'Hello': 'Hola', 'World': 'Mundo'},
+    'fr': {'Hello': 'Bonjour', 'World': 'Monde'},
+    'de': {'Hello': 'Hallo', 'World': 'Welt'},
+    'en': {},
+}
@@ -0,0 +1,102 @@
+from __future__ import unicode_literals
+import sys
+import unittest
+import threading
+
+from pyramid import testing
+
+from tests import Translations
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio requires Python 3.5+')
+class TestAsyncRender(unittest.TestCase):
+
+    def setUp(self):
+        import asyncio
+        from pyramid.i18n import Localizer
+        self.config = testing.setUp(settings={
+            'genshi.async_max_workers': '2',
+        })
+        self.config.include('pyramid_genshi')
+        self.request = testing.DummyRequest()
+        self.request.localizer = Localizer('xx', Translations(upper=True))
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        import asyncio
+        from pyramid_genshi.aio import get_executor
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        get_executor(self.config.registry).shutdown()
+        testing.tearDown()
+
+    def get_renderer(self, name):
+        from pyramid.renderers import get_renderer
+        return get_renderer(name, package='tests')
+
+    def run_async(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def collect(self, chunks):
+        """Collect all chunks of an asynchronous iterator
+
+        """
+        result = []
+        iterator = chunks.__aiter__()
+        while True:
+            try:
+                result.append(self.run_async(iterator.__anext__()))
+            except StopAsyncIteration:
+                return result
+
+    def test_render_async(self):
+        threads = []
+
+        class Name(object):
+            def __str__(self):
+                threads.append(threading.current_thread())
+                return 'foobar'
+
+        renderer = self.get_renderer('fixtures/simple.genshi')
+        body = self.run_async(renderer.render_async(name=Name()))
+        self.assertEqual(body, b'<div>\nfoobar\n</div>')
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_render_async_i18n(self):
+        renderer = self.get_renderer('fixtures/i18n_msg.genshi')
+        body = self.run_async(renderer.render_async(request=self.request))
+        self.assertEqual(body, b'<div>HELLO WORLD</div>')
+        # without request passed, the current request is used
+        self.config.begin(self.request)
+        try:
+            body = self.run_async(renderer.render_async())
+        finally:
+            self.config.end()
+        self.assertEqual(body, b'<div>HELLO WORLD</div>')
+
+    def test_iter_async(self):
+        self.config.registry.settings['genshi.streaming_flush_size'] = '10'
+        renderer = self.get_renderer('fixtures/simple.genshi')
+        renderer.refresh()
+        chunks = self.collect(renderer.iter_async(name='x' * 30))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(b''.join(chunks), b'<div>\n' + b'x' * 30 + b'\n</div>')
+
+    def test_render_helpers(self):
+        from pyramid_genshi import aio
+        body = self.run_async(aio.render(
+            'fixtures/i18n_msg.genshi', {}, request=self.request,
+        ))
+        self.assertEqual(body, b'<div>HELLO WORLD</div>')
+        chunks = self.collect(aio.render_iter(
+            'fixtures/simple.genshi', dict(name='foo'), request=self.request,
+        ))
+        self.assertEqual(b''.join(chunks), b'<div>\nfoo\n</div>')
+
+    def test_get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from pyramid_genshi.aio import get_executor
+        executor = get_executor(self.config.registry)
+        self.assertIsInstance(executor, ThreadPoolExecutor)
+        self.assertIs(get_executor(self.config.registry), executor)
@@ -0,0 +1,120 @@
+from __future__ import unicode_literals
+import threading
+import unittest
+
+import webtest
+from pyramid.config import Configurator
+from pyramid.i18n import Localizer
+
+from tests import CATALOGS
+from tests import Translations
+
+THREADS = 8
+REQUESTS = 30
+
+
+class TestConcurrentRendering(unittest.TestCase):
+
+    def make_app(self, settings=None):
+        def locale_view(request):
+            locale = request.params['locale']
+            request.localizer = Localizer(
+                locale, Translations(CATALOGS[locale]),
+            )
+            return dict(name=request.params['name'])
+
+        config = Configurator(settings=settings or {})
+        config.include('pyramid_genshi')
+        config.add_route('i18n', '/i18n')
+        config.add_view(
+            locale_view,
+            route_name='i18n',
+            renderer='fixtures/i18n_msg.genshi',
+        )
+        config.add_route('include', '/include')
+        config.add_view(
+            locale_view,
+            route_name='include',
+            renderer='fixtures/asset_include.genshi',
+        )
+        return webtest.TestApp(config.make_wsgi_app())
+
+    def stress(self, testapp):
+        """Render from many threads at once, return list of errors
+
+        """
+        start = threading.Event()
+        errors = []
+        expected = {
+            'es': 'Hola Mundo',
+            'fr': 'Bonjour Monde',
+            'de': 'Hallo Welt',
+            'en': 'Hello World',
+        }
+        locales = sorted(expected)
+
+        def worker(index):
+            start.wait()
+            try:
+                for i in range(REQUESTS):
+                    locale = locales[(index + i) % len(locales)]
+                    resp = testapp.get('/i18n', dict(
+                        locale=locale, name='n%s' % i,
+                    ))
+                    if resp.text != '<div>%s</div>' % expected[locale]:
+                        errors.append((locale, resp.text))
+                    resp = testapp.get('/include', dict(
+                        locale=locale, name='n%s' % i,
+                    ))
+                    if 'replaced' not in resp.text:
+                        errors.append((locale, resp.text))
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+
+        threads = [
+            threading.Thread(target=worker, args=(index, ))
+            for index in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        # all threads race to load the templates for the first time
+        start.set()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_render(self):
+        testapp = self.make_app()
+        self.assertEqual(self.stress(testapp), [])
+
+    def test_concurrent_render_caches(self):
+        testapp = self.make_app(settings={
+            'genshi.max_cache_size': '1',
+            'genshi.translation_cache_size': '2',
+            'genshi.instrumentation': 'true',
+        })
+        self.assertEqual(self.stress(testapp), [])
+
+    def test_concurrent_first_load(self):
+        from pyramid_genshi import AssetTemplateLoader
+        from genshi.filters import Translator
+        for _ in range(5):
+            loader = AssetTemplateLoader(translator=Translator())
+            start = threading.Event()
+            results = []
+
+            def worker():
+                start.wait()
+                tmpl = loader.load('tests:fixtures/asset_include.genshi')
+                results.append(tmpl.generate().render())
+
+            threads = [threading.Thread(target=worker)
+                       for _ in range(THREADS)]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(results), THREADS)
+            self.assertEqual(len(set(results)), 1)
+            self.assertIn('replaced', results[0])
@@ -9,6 +9,9 @@ import mock
 import webtest
 from pyramid.config import Configurator
 
+from tests import CATALOGS
+from tests import Translations
+
 NOT_SET = object()
 
 
@@ -57,6 +60,7 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
 
         def assert_render_method(method, expected):
             testapp.app.registry.settings['genshi.method'] = method
+            self.get_renderer_factory(testapp).refresh()
             resp = testapp.get('/')
             self.assertEqual(resp.text, expected)
 
@@ -72,6 +76,7 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
 
         def assert_render_format(format, expected):
             testapp.app.registry.settings['genshi.default_format'] = format
+            self.get_renderer_factory(testapp).refresh()
             resp = testapp.get('/')
             self.assertEqual(resp.text, expected)
 
@@ -85,11 +90,27 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
         )
         assert_render_format('text', '\n')
 
+    def test_render_options_resolved_once(self):
+        testapp = self.make_minimal_app()
+        factory = self.get_renderer_factory(testapp)
+        testapp.get('/')
+        options = factory.options
+        testapp.app.registry.settings['genshi.method'] = 'text'
+        resp = testapp.get('/')
+        self.assertEqual(resp.text, '<div>\n</div>')
+        self.assertIs(factory.options, options)
+
+        factory.refresh()
+        resp = testapp.get('/')
+        self.assertEqual(resp.text, '\n')
+        self.assertEqual(factory.options.method, 'text')
+
     def test_render_doctype(self):
         testapp = self.make_minimal_app()
 
         def assert_doctype(doctype, expected):
             testapp.app.registry.settings['genshi.default_doctype'] = doctype
+            self.get_renderer_factory(testapp).refresh()
             resp = testapp.get('/')
             self.assertEqual(resp.text, expected)
 
@@ -109,6 +130,7 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
 
         def assert_encoding(encoding, expected):
             testapp.app.registry.settings['genshi.default_encoding'] = encoding
+            self.get_renderer_factory(testapp).refresh()
             resp = testapp.get('/')
             self.assertEqual(resp.body, expected)
 
@@ -121,6 +143,24 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
             b'<div>\n\xa4\xa4\xa4\xe5\xa6r\n</div>',
         )
 
+    def test_render_encoded_in_batches(self):
+        testapp = self.make_minimal_app(
+            'fixtures/simple.genshi',
+            values=dict(name='\u4e2d\u6587\u5b57' * 100),
+        )
+        settings = testapp.app.registry.settings
+        expected = '<div>\n%s\n</div>' % ('\u4e2d\u6587\u5b57' * 100)
+        for encoding in ['utf8', 'cp950', 'ascii']:
+            settings['genshi.default_encoding'] = encoding
+            # pieces are encoded a few characters at a time
+            settings['genshi.streaming_flush_size'] = '7'
+            self.get_renderer_factory(testapp).refresh()
+            resp = testapp.get('/')
+            self.assertEqual(
+                resp.body, expected.encode(encoding, 'xmlcharrefreplace'),
+            )
+            self.assertEqual(resp.content_length, len(resp.body))
+
     @mock.patch('pyramid.i18n.Localizer.translate')
     def test_i18n_msg(self, translate_method):
         testapp = self.make_minimal_app('fixtures/i18n_msg.genshi')
@@ -147,6 +187,166 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
         self.assertEqual(ts1.domain, 'test_domain')
         self.assertEqual(ts2.domain, 'test_domain')
 
+    def test_localizer_resolved_once_per_render(self):
+        import pyramid_genshi
+        testapp = self.make_minimal_app('fixtures/i18n_msg.genshi')
+        with mock.patch(
+            'pyramid_genshi.get_localizer',
+            wraps=pyramid_genshi.get_localizer,
+        ) as get_localizer:
+            testapp.get('/')
+            testapp.get('/')
+        self.assertEqual(get_localizer.call_count, 2)
+
+    def test_i18n_per_request_localizer(self):
+        from pyramid.i18n import Localizer
+
+        def locale_view(request):
+            locale = request.params['locale']
+            request.localizer = Localizer(
+                locale, Translations(CATALOGS[locale]),
+            )
+            return {}
+
+        def add_config(config):
+            config.add_view(
+                locale_view,
+                renderer='fixtures/i18n_msg.genshi',
+            )
+
+        testapp = self.make_app(add_config)
+        resp = testapp.get('/', dict(locale='es'))
+        self.assertEqual(resp.text, '<div>Hola Mundo</div>')
+        resp = testapp.get('/', dict(locale='fr'))
+        self.assertEqual(resp.text, '<div>Bonjour Monde</div>')
+
+    def test_fragment_cache_per_locale(self):
+        from pyramid.i18n import Localizer
+
+        def locale_view(request):
+            locale = request.params['locale']
+            request.localizer = Localizer(
+                locale, Translations(CATALOGS[locale]),
+            )
+            return dict(name=request.params['name'])
+
+        def add_config(config):
+            config.add_view(
+                locale_view,
+                renderer='fixtures/fragment_i18n.genshi',
+            )
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.method': 'html',
+        })
+        resp = testapp.get('/', dict(locale='es', name='john'))
+        self.assertEqual(resp.text, '<div><p>Hola john</p></div>')
+        resp = testapp.get('/', dict(locale='fr', name='john'))
+        self.assertEqual(resp.text, '<div><p>Bonjour john</p></div>')
+        resp = testapp.get('/', dict(locale='es', name='tom'))
+        self.assertEqual(resp.text, '<div><p>Hola john</p></div>')
+
+    def test_fragment_cache_per_locale_without_i18n(self):
+        from pyramid.i18n import Localizer
+
+        def locale_view(request):
+            locale = request.params['locale']
+            request.localizer = Localizer(
+                locale, Translations(CATALOGS[locale]),
+            )
+            return dict(name=request.params['name'])
+
+        def add_config(config):
+            config.add_view(
+                locale_view,
+                renderer='fixtures/fragment_gettext.genshi',
+            )
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.method': 'html',
+            'genshi.i18n': 'false',
+        })
+        # the _ function translates even without the i18n filter
+        resp = testapp.get('/', dict(locale='es', name='john'))
+        self.assertEqual(resp.text, '<div><p>Hola john</p></div>')
+        resp = testapp.get('/', dict(locale='fr', name='john'))
+        self.assertEqual(resp.text, '<div><p>Bonjour john</p></div>')
+        resp = testapp.get('/', dict(locale='es', name='tom'))
+        self.assertEqual(resp.text, '<div><p>Hola john</p></div>')
+
+    def test_pretranslate(self):
+        from pyramid.i18n import Localizer
+        msg = 'Hello %(name)s [1:friend]'
+
+        def make_translations(catalog):
+            # notice: messages of i18n:msg must keep their placeholders
+            catalog[msg] = msg
+            return Translations(catalog, upper=True)
+
+        catalogs = {
+            'es': make_translations({'Header': 'Cabecera', 'Logo': 'Logotipo'}),
+            'fr': make_translations({'Header': 'En-tete'}),
+        }
+
+        def count_calls(message):
+            return sum(
+                translations.calls.count(message)
+                for translations in catalogs.values()
+            )
+
+        def locale_view(request):
+            request.localizer = Localizer(
+                request.params['locale'], catalogs[request.params['locale']],
+            )
+            return dict(
+                items=['a', 'b'],
+                show=True,
+                cls='c',
+                strip=False,
+                name=request.params['name'],
+                empty='',
+            )
+
+        def add_config(config):
+            config.add_view(locale_view, renderer='fixtures/static.genshi')
+
+        def get_all(testapp):
+            return [
+                testapp.get('/', dict(locale=locale, name=name)).text
+                for locale in ['es', 'fr']
+                for name in ['john', 'tom']
+            ]
+
+        expected = get_all(self.make_app(add_config))
+        self.assertIn('<h1>Cabecera</h1>', expected[0])
+        self.assertIn('alt="Logotipo"', expected[0])
+        self.assertIn('<i>STATIC</i>', expected[0])
+        self.assertIn('Hello john <b>friend</b>', expected[0])
+        self.assertIn('<h1>En-tete</h1>', expected[2])
+
+        for settings in [
+            {'genshi.pretranslate': 'true'},
+            {'genshi.pretranslate': 'true', 'genshi.fold_static': 'true'},
+        ]:
+            # so that every translation reaches the catalog
+            settings['genshi.translation_cache_size'] = '0'
+            testapp = self.make_app(add_config, settings=settings)
+            for translations in catalogs.values():
+                del translations.calls[:]
+            self.assertEqual(get_all(testapp), expected)
+            # static text is translated once per locale, only i18n:msg is
+            # translated when rendering
+            self.assertEqual(count_calls('Header'), 2)
+            self.assertEqual(count_calls(msg), 4)
+
+            # replacing the catalog of a locale makes it translated again
+            catalogs['es'] = make_translations({'Header': 'Encabezado'})
+            resp = testapp.get('/', dict(locale='es', name='john'))
+            self.assertIn('<h1>Encabezado</h1>', resp.text)
+            catalogs['es'] = make_translations(
+                {'Header': 'Cabecera', 'Logo': 'Logotipo'},
+            )
+
     @unittest.skip('Known bug, wont fix currently')
     @mock.patch('pyramid.i18n.Localizer.translate')
     def test_i18n_domain(self, translate_method):
@@ -169,6 +369,381 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
         #
         self.assertEqual(ts2.domain, 'test_domain')
 
+    def test_streaming(self):
+        testapp = self.make_minimal_app(
+            template='fixtures/simple.genshi',
+            values=dict(name='foobar'),
+        )
+        settings = testapp.app.registry.settings
+        settings['genshi.streaming'] = 'true'
+        settings['genshi.streaming_flush_size'] = '4'
+        resp = testapp.get('/')
+        self.assertEqual(resp.text, '<div>\nfoobar\n</div>')
+
+        settings['genshi.default_encoding'] = 'cp950'
+        testapp = self.make_minimal_app('fixtures/chinese.genshi')
+        testapp.app.registry.settings.update(settings)
+        resp = testapp.get('/')
+        self.assertEqual(
+            resp.body,
+            b'<div>\n\xa4\xa4\xa4\xe5\xa6r\n</div>',
+        )
+
+    def test_streaming_chunks(self):
+        from pyramid_genshi import GenshiTemplateRenderer
+        path = os.path.join(
+            os.path.dirname(__file__), 'fixtures', 'simple.genshi',
+        )
+        renderer = GenshiTemplateRenderer(path, {
+            'genshi.i18n': 'false',
+            'genshi.streaming_flush_size': '4',
+        })
+        chunks = list(renderer.render_iter(name='foobar'))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(b''.join(chunks), b'<div>\nfoobar\n</div>')
+
+    def test_streaming_app_iter(self):
+        from pyramid import testing
+        from pyramid_genshi import GenshiTemplateRenderer
+        path = os.path.join(
+            os.path.dirname(__file__), 'fixtures', 'simple.genshi',
+        )
+        renderer = GenshiTemplateRenderer(path, {
+            'genshi.i18n': 'false',
+            'genshi.streaming': 'true',
+            'genshi.streaming_flush_size': '4',
+        })
+        testing.setUp()
+        try:
+            request = testing.DummyRequest()
+            result = renderer(dict(name='foobar'), dict(
+                request=request,
+                view=object(),
+            ))
+        finally:
+            testing.tearDown()
+        self.assertIsNone(result)
+        chunks = list(request.response.app_iter)
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(b''.join(chunks), b'<div>\nfoobar\n</div>')
+
+    def test_streaming_per_view(self):
+        def streaming_view(request):
+            request.genshi_streaming = True
+            return dict(name='foobar')
+
+        def add_config(config):
+            config.add_view(
+                streaming_view,
+                renderer='fixtures/simple.genshi',
+            )
+
+        testapp = self.make_app(add_config)
+        with mock.patch(
+            'pyramid_genshi.GenshiTemplateRenderer.render',
+        ) as render:
+            resp = testapp.get('/')
+        self.assertFalse(render.called)
+        self.assertEqual(resp.text, '<div>\nfoobar\n</div>')
+
+    def test_text_renderer(self):
+        from genshi.template import NewTextTemplate
+        from pyramid.i18n import Localizer
+        from pyramid.interfaces import IRendererFactory
+
+        def text_view(request):
+            request.localizer = Localizer('xx', Translations(upper=True))
+            return dict(name='<foo>', items=['\u4e2d', 'b'])
+
+        def add_config(config):
+            config.add_view(text_view, renderer='fixtures/text.genshitxt')
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.default_doctype': 'html5',
+            'genshi.fold_static': 'true',
+            'genshi.text.default_encoding': 'cp950',
+            'genshi.text.max_cache_size': '5',
+        })
+        resp = testapp.get('/')
+        # no markup escaping, doctype, nor encoding of markup templates
+        self.assertEqual(
+            resp.body,
+            'Hello <foo> <WORLD>\n* \u4e2d\n* b\n'.encode('cp950'),
+        )
+        self.assertEqual(resp.content_length, len(resp.body))
+
+        registry = testapp.app.registry
+        factory = registry.getUtility(IRendererFactory, name='.genshitxt')
+        loader = factory.loader
+        self.assertIsNot(loader, self.get_renderer_factory(testapp).loader)
+        self.assertIsNone(loader.translator)
+        self.assertEqual(loader.max_cache_size, 5)
+        self.assertEqual(factory.options.method, 'text')
+        self.assertEqual(factory.options.encoding, 'cp950')
+        self.assertEqual([cls for path, cls in loader._cache],
+                         [NewTextTemplate])
+
+    def get_renderer_factory(self, testapp):
+        from pyramid.interfaces import IRendererFactory
+        registry = testapp.app.registry
+        return registry.getUtility(IRendererFactory, name='.genshi')
+
+    def test_preload(self):
+        testapp = self.make_app(settings={
+            'genshi.preload': 'tests:fixtures/simple.genshi\n'
+                              'tests:fixtures/',
+        })
+        factory = self.get_renderer_factory(testapp)
+        fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+        cached_paths = set(path for path, cls in factory.loader._cache)
+        self.assertIn(os.path.join(fixtures_dir, 'simple.genshi'), cached_paths)
+        self.assertIn(os.path.join(fixtures_dir, 'included.genshi'), cached_paths)
+        self.assertNotIn(os.path.join(fixtures_dir, 'minimal.txt'), cached_paths)
+        self.assertNotIn(os.path.join(fixtures_dir, 'text.genshitxt'),
+                         cached_paths)
+
+    def test_preload_freeze(self):
+        with mock.patch('gc.freeze', create=True) as freeze:
+            testapp = self.make_app(settings={
+                'genshi.preload': 'tests:fixtures/',
+                'genshi.preload_freeze': 'true',
+            })
+        self.assertEqual(freeze.call_count, 1)
+        factory = self.get_renderer_factory(testapp)
+        fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+        frozen_paths = set(path for path, cls in factory.loader._frozen)
+        self.assertIn(os.path.join(fixtures_dir, 'simple.genshi'), frozen_paths)
+
+    def test_genshi_warm(self):
+        def add_config(config):
+            config.genshi_warm('fixtures/minimal.txt', extensions=['.txt'])
+
+        with mock.patch(
+            'pyramid_genshi.GenshiTemplateRendererFactory.warm',
+        ) as warm:
+            testapp = self.make_app(add_config)
+        import tests
+        warm.assert_called_once_with(
+            ['fixtures/minimal.txt'],
+            testapp.app.registry.settings,
+            tests,
+            ('.txt', ),
+        )
+
+    def test_genshi_warm_text(self):
+        from genshi.template import MarkupTemplate
+        from genshi.template import NewTextTemplate
+        from pyramid.interfaces import IRendererFactory
+
+        def add_config(config):
+            config.genshi_warm(
+                'fixtures/text.genshitxt', 'fixtures/minimal.genshi',
+                freeze=True,
+            )
+
+        with mock.patch('gc.freeze', create=True):
+            testapp = self.make_app(add_config)
+        registry = testapp.app.registry
+        fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+        # each template is loaded by the factory of its extension
+        loader = registry.getUtility(IRendererFactory, name='.genshi').loader
+        self.assertEqual(set(loader._frozen), set([
+            (os.path.join(fixtures_dir, 'minimal.genshi'), MarkupTemplate),
+        ]))
+        loader = registry.getUtility(
+            IRendererFactory, name='.genshitxt',
+        ).loader
+        self.assertEqual(set(loader._frozen), set([
+            (os.path.join(fixtures_dir, 'text.genshitxt'), NewTextTemplate),
+        ]))
+
+    def test_instrumentation(self):
+        from pyramid_genshi import TemplateRendered
+        events = []
+
+        def add_config(config):
+            config.add_view(
+                lambda request: {},
+                renderer='fixtures/asset_include.genshi',
+            )
+            config.add_subscriber(events.append, TemplateRendered)
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.instrumentation': 'true',
+        })
+        testapp.get('/')
+        resp = testapp.get('/')
+        self.assertIn('replaced', resp.text)
+
+        fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+        path = os.path.join(fixtures_dir, 'asset_include.genshi')
+        self.assertEqual(len(events), 2)
+        self.assertEqual([event.path for event in events], [path, path])
+        self.assertEqual([event.cache_hit for event in events], [False, True])
+        self.assertEqual(events[1].size, len(resp.body))
+        self.assertIsNotNone(events[1].request)
+        for event in events:
+            self.assertTrue(event.generate_time > 0)
+            self.assertTrue(event.serialize_time > 0)
+
+        factory = self.get_renderer_factory(testapp)
+        stats = factory.loader.stats.snapshot()
+        self.assertEqual(stats[path]['renders'], 2)
+        self.assertEqual(stats[path]['bytes'], len(resp.body) * 2)
+        self.assertEqual(stats[path]['misses'], 1)
+        self.assertEqual(stats[path]['hits'], 1)
+        included = stats[os.path.join(fixtures_dir, 'included.genshi')]
+        self.assertEqual(included['misses'], 1)
+        self.assertEqual(included['renders'], 0)
+
+    def test_instrumentation_streaming(self):
+        from pyramid_genshi import TemplateRendered
+        events = []
+        testapp = self.make_minimal_app(
+            template='fixtures/simple.genshi',
+            values=dict(name='foobar'),
+        )
+        testapp.app.registry.settings.update({
+            'genshi.instrumentation': 'true',
+            'genshi.streaming': 'true',
+        })
+        testapp.app.registry.registerHandler(
+            events.append, (TemplateRendered, ),
+        )
+        resp = testapp.get('/')
+        self.assertEqual(len(events), 1)
+        self.assertIsNone(events[0].generate_time)
+        self.assertEqual(events[0].size, len(resp.body))
+
+    def test_render_cache(self):
+        from pyramid_genshi import CACHE_BY_VALUES
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            request.genshi_cache_key = CACHE_BY_VALUES
+            if 'key' in request.params:
+                request.genshi_cache_key = request.params['key'] or None
+            return dict(name=request.params.get('name', 'foo'))
+
+        def add_config(config):
+            config.add_view(view, renderer='fixtures/simple.genshi')
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.render_cache': 'true',
+        })
+        self.assertEqual(testapp.get('/').text, '<div>\nfoo\n</div>')
+        self.assertEqual(testapp.get('/').text, '<div>\nfoo\n</div>')
+        cache = self.get_renderer_factory(testapp).loader.render_cache
+        self.assertEqual(cache.stats()['hits'], 1)
+        resp = testapp.get('/', dict(name='bar'))
+        self.assertEqual(resp.text, '<div>\nbar\n</div>')
+        # key provided by view
+        resp = testapp.get('/', dict(name='eggs', key='k'))
+        self.assertEqual(resp.text, '<div>\neggs\n</div>')
+        resp = testapp.get('/', dict(name='spam', key='k'))
+        self.assertEqual(resp.text, '<div>\neggs\n</div>')
+        # None key for not caching
+        resp = testapp.get('/', dict(name='spam', key=''))
+        self.assertEqual(resp.text, '<div>\nspam\n</div>')
+        self.assertEqual(cache.stats(), dict(
+            size=3, bytes=len(b'<div>\nfoo\n</div>') * 3 + 1, hits=2,
+            misses=3,
+        ))
+        self.assertEqual(len(calls), 6)
+
+    def test_render_cache_opt_in(self):
+        from pyramid.i18n import Localizer
+
+        def view(request):
+            request.localizer = Localizer(
+                request.params['locale'],
+                Translations(CATALOGS[request.params['locale']]),
+            )
+            if 'cached' in request.params:
+                request.genshi_cache_key = 'page'
+            return {}
+
+        def add_config(config):
+            config.add_view(view, renderer='fixtures/request_user.genshi')
+
+        testapp = self.make_app(add_config, settings={
+            'genshi.render_cache': 'true',
+            'genshi.i18n': 'false',
+        })
+        # views not opted in are never cached
+        resp = testapp.get('/', dict(user='alice', locale='es'))
+        self.assertEqual(resp.text, '<div>Hola alice</div>')
+        resp = testapp.get('/', dict(user='bob', locale='es'))
+        self.assertEqual(resp.text, '<div>Hola bob</div>')
+        cache = self.get_renderer_factory(testapp).loader.render_cache
+        self.assertEqual(cache.stats()['size'], 0)
+
+        # the locale is part of the key, even without the i18n filter
+        resp = testapp.get('/', dict(user='alice', locale='es', cached=1))
+        self.assertEqual(resp.text, '<div>Hola alice</div>')
+        resp = testapp.get('/', dict(user='bob', locale='fr', cached=1))
+        self.assertEqual(resp.text, '<div>Bonjour bob</div>')
+        resp = testapp.get('/', dict(user='bob', locale='es', cached=1))
+        self.assertEqual(resp.text, '<div>Hola alice</div>')
+
+    def test_render_cache_limits_and_reload(self):
+        from pyramid_genshi import CACHE_BY_VALUES
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'tmpl.genshi')
+            with open(path, 'wt') as tmpl_file:
+                tmpl_file.write('<div>${ name }</div>')
+
+            def view(request):
+                request.genshi_cache_key = CACHE_BY_VALUES
+                return dict(name=request.params['name'])
+
+            def add_config(config):
+                config.add_view(view, renderer=path)
+
+            testapp = self.make_app(add_config, settings={
+                'genshi.render_cache': 'true',
+                'genshi.render_cache_max_bytes': '30',
+                'genshi.render_cache_ttl': '60',
+            })
+            testapp.get('/', dict(name='a'))
+            cache = self.get_renderer_factory(testapp).loader.render_cache
+            testapp.get('/', dict(name='b'))
+            self.assertEqual(cache.stats()['size'], 2)
+            testapp.get('/', dict(name='c'))
+            # each body is 12 bytes
+            self.assertEqual(cache.stats()['size'], 2)
+            self.assertEqual(cache.stats()['bytes'], 24)
+
+            with open(path, 'wt') as tmpl_file:
+                tmpl_file.write('<p>${ name }</p>')
+            mtime = time.time() + 10
+            os.utime(path, (mtime, mtime))
+            resp = testapp.get('/', dict(name='c'))
+            self.assertEqual(resp.text, '<p>c</p>')
+            self.assertEqual(cache.stats()['hits'], 0)
+
+            testapp.get('/', dict(name='c'))
+            self.assertEqual(cache.stats()['hits'], 1)
+            with mock.patch('time.time', return_value=time.time() + 61):
+                testapp.get('/', dict(name='c'))
+            self.assertEqual(cache.stats()['hits'], 1)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_fold_static(self):
+        testapp = self.make_minimal_app(
+            template='fixtures/asset_include.genshi',
+        )
+        expected = testapp.get('/').text
+        testapp = self.make_minimal_app(
+            template='fixtures/asset_include.genshi',
+        )
+        testapp.app.registry.settings['genshi.fold_static'] = 'true'
+        self.assertEqual(testapp.get('/').text, expected)
+        self.assertTrue(self.get_renderer_factory(testapp).loader.fold_static)
+
     def test_render_with_wrong_argument(self):
         testapp = self.make_minimal_app(values=None)
         with self.assertRaises(ValueError):
@@ -240,3 +815,65 @@ class TestGenshiTemplateRendererIntegration(unittest.TestCase):
             shutil.rmtree(tmp_dir)
             if os.path.exists(included_path):
                 os.remove(included_path)
+
+
+class TestRenderMany(unittest.TestCase):
+
+    def setUp(self):
+        from pyramid import testing
+        from pyramid.i18n import Localizer
+        self.request = testing.DummyRequest()
+        self.request.localizer = Localizer('xx', Translations(upper=True))
+        self.config = testing.setUp(request=self.request)
+        self.config.include('pyramid_genshi')
+
+    def tearDown(self):
+        from pyramid import testing
+        testing.tearDown()
+
+    def get_renderer(self, name):
+        from pyramid.renderers import get_renderer
+        return get_renderer(name, package='tests')
+
+    def test_render_many(self):
+        import pyramid_genshi
+        renderer = self.get_renderer('fixtures/simple.genshi')
+        with mock.patch(
+            'pyramid_genshi.get_localizer',
+            wraps=pyramid_genshi.get_localizer,
+        ) as get_localizer:
+            bodies = list(renderer.render_many(
+                (dict(name=name) for name in ['a', 'b', 'c']),
+            ))
+        self.assertEqual(get_localizer.call_count, 1)
+        self.assertEqual(bodies, [
+            b'<div>\na\n</div>',
+            b'<div>\nb\n</div>',
+            b'<div>\nc\n</div>',
+        ])
+
+    def test_render_many_i18n(self):
+        from pyramid_genshi import render_many
+        bodies = list(render_many(
+            'fixtures/i18n_msg.genshi', [{}, {}], request=self.request,
+        ))
+        self.assertEqual(bodies, [b'<div>HELLO WORLD</div>'] * 2)
+
+    def test_render_many_processes(self):
+        renderer = self.get_renderer('fixtures/i18n_msg.genshi')
+        expected = renderer.render(request=self.request)
+        self.assertEqual(expected, b'<div>HELLO WORLD</div>')
+        bodies = list(renderer.render_many(
+            [{}] * 5, processes=2, chunksize=2, request=self.request,
+        ))
+        self.assertEqual(bodies, [expected] * 5)
+
+        renderer = self.get_renderer('fixtures/simple.genshi')
+        names = ['name %s' % i for i in range(20)]
+        bodies = list(renderer.render_many(
+            (dict(name=name) for name in names), processes=2, chunksize=3,
+        ))
+        self.assertEqual(
+            bodies,
+            [('<div>\n%s\n</div>' % name).encode('utf8') for name in names],
+        )
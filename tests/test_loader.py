@@ -0,0 +1,842 @@
+from __future__ import unicode_literals
+import os
+import unittest
+
+from genshi.template import MarkupTemplate
+from genshi.template import NewTextTemplate
+from genshi.template import TemplateNotFound
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class TestAssetTemplateLoader(unittest.TestCase):
+
+    def make_one(self, *args, **kwargs):
+        from pyramid_genshi import AssetTemplateLoader
+        return AssetTemplateLoader(*args, **kwargs)
+
+    def test_resolve(self):
+        loader = self.make_one()
+        simple_path = os.path.join(FIXTURES_DIR, 'simple.genshi')
+        self.assertEqual(loader.resolve(simple_path), simple_path)
+        self.assertEqual(
+            loader.resolve('tests:fixtures/simple.genshi'),
+            simple_path,
+        )
+        self.assertEqual(
+            loader.resolve('./simple.genshi', relative_to=simple_path),
+            simple_path,
+        )
+        with self.assertRaises(TemplateNotFound):
+            loader.resolve('simple.genshi')
+
+    def test_resolve_asset_memoized(self):
+        import mock
+        import tests
+        import pyramid_genshi
+        loader = self.make_one()
+        simple_path = os.path.join(FIXTURES_DIR, 'simple.genshi')
+        with mock.patch(
+            'pyramid_genshi.AssetResolver',
+            wraps=pyramid_genshi.AssetResolver,
+        ) as resolver:
+            for _ in range(2):
+                self.assertEqual(
+                    loader.resolve_asset('fixtures/simple.genshi', tests),
+                    simple_path,
+                )
+                self.assertEqual(
+                    loader.resolve('tests:fixtures/simple.genshi'),
+                    simple_path,
+                )
+            self.assertEqual(resolver.call_count, 2)
+            loader.clear()
+            loader.resolve('tests:fixtures/simple.genshi')
+            self.assertEqual(resolver.call_count, 3)
+
+    def test_load_not_found(self):
+        loader = self.make_one()
+        with self.assertRaises(TemplateNotFound):
+            loader.load('tests:fixtures/not_exist.genshi')
+
+    def test_load_cached_by_path_and_class(self):
+        loader = self.make_one()
+        path = os.path.join(FIXTURES_DIR, 'minimal.genshi')
+        tmpl = loader.load(path)
+        self.assertIsInstance(tmpl, MarkupTemplate)
+        self.assertIs(loader.load(path), tmpl)
+        self.assertIs(loader.load('tests:fixtures/minimal.genshi'), tmpl)
+
+        text_tmpl = loader.load(path, cls=NewTextTemplate)
+        self.assertIsInstance(text_tmpl, NewTextTemplate)
+        self.assertIsNot(text_tmpl, tmpl)
+
+    def test_lru_eviction(self):
+        loader = self.make_one(max_cache_size=2)
+        minimal = loader.load('tests:fixtures/minimal.genshi')
+        simple = loader.load('tests:fixtures/simple.genshi')
+        # touch minimal, so that simple is the least recently used one
+        self.assertIs(loader.load('tests:fixtures/minimal.genshi'), minimal)
+        loader.load('tests:fixtures/chinese.genshi')
+        self.assertEqual(len(loader._cache), 2)
+        self.assertIs(loader.load('tests:fixtures/minimal.genshi'), minimal)
+        self.assertIsNot(loader.load('tests:fixtures/simple.genshi'), simple)
+
+    def test_max_cache_bytes(self):
+        from pyramid_genshi import RenderStats
+        from pyramid_genshi import estimate_size
+        loader = self.make_one(max_cache_size=10)
+        minimal = loader.load('tests:fixtures/minimal.genshi')
+        simple = loader.load('tests:fixtures/simple.genshi')
+        minimal_size = estimate_size(minimal)
+        simple_size = estimate_size(simple)
+        # sizes are only estimated for max_cache_bytes or instrumentation
+        self.assertIsNone(loader.cache_stats()['bytes'])
+        loader = self.make_one(max_cache_size=10, stats=RenderStats())
+        loader.load('tests:fixtures/minimal.genshi')
+        self.assertEqual(loader.cache_stats()['bytes'], minimal_size)
+        self.assertTrue(minimal_size > 0)
+        self.assertTrue(estimate_size(loader.load(
+            'tests:fixtures/asset_include.genshi',
+        )) > minimal_size)
+
+        loader = self.make_one(
+            max_cache_size=10,
+            max_cache_bytes=minimal_size + simple_size,
+        )
+        minimal = loader.load('tests:fixtures/minimal.genshi')
+        loader.load('tests:fixtures/simple.genshi')
+        self.assertEqual(loader.cache_stats(), dict(
+            size=2,
+            bytes=minimal_size + simple_size,
+            max_size=10,
+            max_bytes=minimal_size + simple_size,
+            evictions=0,
+            reloads=0,
+        ))
+        loader.load('tests:fixtures/minimal.genshi')
+        loader.load('tests:fixtures/chinese.genshi')
+        stats = loader.cache_stats()
+        self.assertTrue(stats['evictions'] >= 1)
+        self.assertTrue(stats['bytes'] <= minimal_size + simple_size)
+        self.assertEqual(stats['bytes'], sum(
+            entry.size for entry in loader._cache.values()
+        ))
+        self.assertNotIn(
+            (os.path.join(FIXTURES_DIR, 'simple.genshi'), MarkupTemplate),
+            loader._cache,
+        )
+
+        # the newest template is kept even if it's larger than the limit
+        loader = self.make_one(max_cache_bytes=1)
+        loader.load('tests:fixtures/minimal.genshi')
+        loader.load('tests:fixtures/simple.genshi')
+        self.assertEqual(len(loader._cache), 1)
+        self.assertEqual(loader.cache_stats()['evictions'], 1)
+        loader.clear()
+        self.assertEqual(loader.cache_stats()['bytes'], 0)
+
+    def test_translator_setup(self):
+        from genshi.filters import Translator
+        translator = Translator()
+        loader = self.make_one(translator=translator)
+        tmpl = loader.load('tests:fixtures/minimal.genshi')
+        self.assertIs(tmpl.filters[0], translator)
+
+
+class TestGenshiTemplateRendererFactory(unittest.TestCase):
+
+    def setUp(self):
+        from pyramid import testing
+        self.config = testing.setUp(request=testing.DummyRequest())
+
+    def tearDown(self):
+        from pyramid import testing
+        testing.tearDown()
+
+    def make_info(self, name):
+        import tests
+
+        class Info(object):
+            pass
+        info = Info()
+        info.name = name
+        info.package = tests
+        info.settings = {}
+        return info
+
+    def test_shared_loader(self):
+        from pyramid_genshi import GenshiTemplateRendererFactory
+        factory = GenshiTemplateRendererFactory()
+        renderer1 = factory(self.make_info('fixtures/asset_include.genshi'))
+        renderer2 = factory(self.make_info('fixtures/relative_include.genshi'))
+        self.assertIs(renderer1.loader, renderer2.loader)
+        self.assertIs(renderer1.loader, factory.loader)
+
+        renderer1.template
+        renderer2.template
+        included_path = os.path.join(FIXTURES_DIR, 'included.genshi')
+        included = factory.loader.load(included_path)
+        for tmpl in (renderer1.template, renderer2.template):
+            tmpl.generate().render()
+        self.assertIs(factory.loader.load(included_path), included)
+        # asset_include, relative_include and included
+        self.assertEqual(len(factory.loader._cache), 3)
+
+    def test_warm(self):
+        from pyramid_genshi import GenshiTemplateRendererFactory
+        import tests
+        factory = GenshiTemplateRendererFactory()
+        timings = factory.warm(['fixtures/'], {}, tests)
+        paths = [path for path, elapsed in timings]
+        self.assertIn(os.path.join(FIXTURES_DIR, 'minimal.genshi'), paths)
+        self.assertEqual(paths, sorted(paths))
+        for path in paths:
+            self.assertIs(factory.loader.load(path), factory.loader.load(path))
+
+
+def mock_lock(loader):
+    """Make acquiring lock of loader fail
+
+    """
+    import mock
+    return mock.patch.object(loader, '_lock', None)
+
+
+class TestAssetTemplateLoaderReload(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'tmpl.genshi')
+        self.write('before')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mtime=None):
+        with open(self.path, 'wt') as tmpl_file:
+            tmpl_file.write('<div>%s</div>' % text)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def render(self, loader):
+        return loader.load(self.path).generate().render()
+
+    def make_one(self, *args, **kwargs):
+        from pyramid_genshi import AssetTemplateLoader
+        return AssetTemplateLoader(*args, **kwargs)
+
+    def test_check_interval(self):
+        import time
+        import mock
+        loader = self.make_one(auto_reload=True, check_interval=60)
+        self.assertEqual(self.render(loader), '<div>before</div>')
+        self.write('after', mtime=time.time() + 10)
+        with mock.patch('os.path.getmtime') as getmtime:
+            self.assertEqual(self.render(loader), '<div>before</div>')
+        self.assertFalse(getmtime.called)
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.render(loader), '<div>after</div>')
+
+    def test_check_outdated(self):
+        import time
+        import mock
+        loader = self.make_one(auto_reload=True, watch=True)
+        with mock.patch.object(loader, '_start_watcher') as start_watcher:
+            self.assertEqual(self.render(loader), '<div>before</div>')
+        loader.resolve_asset(self.path)
+        self.assertEqual(loader._resolved, {(self.path, None): self.path})
+        self.assertTrue(start_watcher.called)
+        self.write('after', mtime=time.time() + 10)
+        self.assertEqual(self.render(loader), '<div>before</div>')
+        self.assertEqual(loader.check_outdated(),
+                         [(self.path, MarkupTemplate)])
+        self.assertEqual(loader._resolved, {})
+        self.assertEqual(self.render(loader), '<div>after</div>')
+        self.assertEqual(loader.check_outdated(), [])
+        self.assertEqual(loader.cache_stats()['reloads'], 1)
+
+    def test_reload_counted(self):
+        import time
+        loader = self.make_one(auto_reload=True, max_cache_bytes=10 ** 6)
+        self.assertEqual(self.render(loader), '<div>before</div>')
+        size = loader.cache_stats()['bytes']
+        self.write('after, with a longer text', mtime=time.time() + 10)
+        self.assertEqual(self.render(loader),
+                         '<div>after, with a longer text</div>')
+        stats = loader.cache_stats()
+        self.assertEqual(stats['reloads'], 1)
+        self.assertEqual(stats['evictions'], 0)
+        self.assertEqual(stats['size'], 1)
+        self.assertTrue(stats['bytes'] > size)
+
+    def write_layout(self, text, mtime=None):
+        layout_path = os.path.join(self.tmp_dir, 'layout.genshi')
+        with open(layout_path, 'wt') as tmpl_file:
+            tmpl_file.write(
+                '<py:match xmlns:py="http://genshi.edgewall.org/" '
+                'path="span"><span>%s</span></py:match>' % text
+            )
+        if mtime is not None:
+            os.utime(layout_path, (mtime, mtime))
+        return layout_path
+
+    def write_page(self, name, includes):
+        page_path = os.path.join(self.tmp_dir, name)
+        with open(page_path, 'wt') as tmpl_file:
+            tmpl_file.write(
+                '<div xmlns:xi="http://www.w3.org/2001/XInclude">%s'
+                '<span>page</span></div>' % ''.join(
+                    '<xi:include href="%s" />' % include
+                    for include in includes
+                )
+            )
+        return page_path
+
+    def test_include_graph(self):
+        layout_path = self.write_layout('layout')
+        page_path = self.write_page('page.genshi', ['layout.genshi'])
+        other_path = self.write_page('other.genshi', [
+            'page.genshi', '${dynamic}', 'missing.genshi',
+        ])
+        loader = self.make_one(auto_reload=True)
+        loader.load(other_path)
+        self.assertEqual(loader.includes(other_path), set([
+            page_path, os.path.join(self.tmp_dir, 'missing.genshi'),
+        ]))
+        loader.load(page_path)
+        loader.load(layout_path)
+        self.assertEqual(loader.includes(other_path), set([
+            page_path, layout_path,
+            os.path.join(self.tmp_dir, 'missing.genshi'),
+        ]))
+        self.assertEqual(loader.dependents(layout_path),
+                         set([page_path, other_path]))
+        self.assertEqual(loader.dependents(other_path), set())
+        self.assertEqual(loader.fan_in(), [
+            (layout_path, 2),
+            (os.path.join(self.tmp_dir, 'missing.genshi'), 1),
+            (page_path, 1),
+        ])
+
+    def test_included_modified(self):
+        import time
+        layout_path = self.write_layout('before')
+        page_path = self.write_page('page.genshi', ['layout.genshi'])
+        other_path = self.write_page('other.genshi', [])
+        loader = self.make_one(auto_reload=True)
+        page = loader.load(page_path)
+        other = loader.load(other_path)
+        self.assertEqual(page.generate().render(),
+                         '<div><span>before</span></div>')
+        self.assertEqual(loader._cache[(page_path, MarkupTemplate)].depends,
+                         {layout_path: os.path.getmtime(layout_path)})
+
+        self.write_layout('after', mtime=time.time() + 10)
+        # the page is outdated because of its layout
+        new_page = loader.load(page_path)
+        self.assertIsNot(new_page, page)
+        self.assertIs(loader.load(other_path), other)
+        self.assertEqual(new_page.generate().render(),
+                         '<div><span>after</span></div>')
+
+        self.write_layout('again', mtime=time.time() + 20)
+        # only the layout and the page including it are discarded
+        self.assertEqual(sorted(loader.check_outdated()), [
+            (layout_path, MarkupTemplate), (page_path, MarkupTemplate),
+        ])
+        self.assertIs(loader.load(other_path), other)
+        self.assertEqual(loader.load(page_path).generate().render(),
+                         '<div><span>again</span></div>')
+        # the layout and the page are discarded twice
+        self.assertEqual(loader.cache_stats()['reloads'], 4)
+
+    def test_include_chain_checked_once(self):
+        import time
+        import mock
+        names = ['a.genshi', 'b.genshi', 'c.genshi', 'd.genshi', 'e.genshi']
+        for name, included in zip(names, names[1:] + [None]):
+            self.write_page(name, [included] if included else [])
+        page_path = os.path.join(self.tmp_dir, names[0])
+        loader = self.make_one(auto_reload=True)
+        expected = loader.load(page_path).generate().render()
+
+        getmtime = os.path.getmtime
+        with mock.patch('os.path.getmtime', side_effect=getmtime) as patched:
+            tmpl = loader.load(page_path)
+            self.assertEqual(tmpl.generate().render(), expected)
+        # each file of the chain is checked only once
+        self.assertEqual(patched.call_count, len(names))
+
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.tmp_dir, 'e.genshi'), (mtime, mtime))
+        self.assertIsNot(loader.load(page_path), tmpl)
+
+        # files checked with a previous render are checked again when a page
+        # not loaded yet includes them
+        self.write_layout('before')
+        page_path = self.write_page('page.genshi', ['layout.genshi'])
+        other_path = self.write_page('other.genshi', ['layout.genshi'])
+        for _ in range(2):
+            self.assertEqual(loader.load(page_path).generate().render(),
+                             '<div><span>before</span></div>')
+        self.write_layout('after', mtime=time.time() + 20)
+        self.assertEqual(loader.load(other_path).generate().render(),
+                         '<div><span>after</span></div>')
+
+    def test_freeze(self):
+        import time
+        loader = self.make_one(auto_reload=True)
+        tmpl = loader.load(self.path)
+        self.assertEqual(loader.freeze(), 1)
+        self.write('after', mtime=time.time() + 10)
+        with mock_lock(loader):
+            self.assertIs(loader.load(self.path), tmpl)
+        loader.clear()
+        self.assertEqual(self.render(loader), '<div>after</div>')
+
+    def test_watcher(self):
+        import time
+        loader = self.make_one(auto_reload=True, watch=True,
+                               check_interval=0.1)
+        try:
+            self.assertEqual(self.render(loader), '<div>before</div>')
+            self.write('after', mtime=time.time() + 10)
+            for _ in range(50):
+                if self.render(loader) == '<div>after</div>':
+                    break
+                time.sleep(0.1)
+            self.assertEqual(self.render(loader), '<div>after</div>')
+        finally:
+            loader.watch = False
+
+    def test_watcher_restarted(self):
+        import time
+        loader = self.make_one(auto_reload=True, watch=True,
+                               check_interval=0.1)
+        try:
+            self.assertEqual(self.render(loader), '<div>before</div>')
+            # like in a forked child process, the thread is not running
+            # while templates are cached
+            loader.watch = False
+            loader._watcher.join()
+            loader.watch = True
+            self.write('after', mtime=time.time() + 10)
+            for _ in range(50):
+                if self.render(loader) == '<div>after</div>':
+                    break
+                time.sleep(0.1)
+            self.assertEqual(self.render(loader), '<div>after</div>')
+            self.assertTrue(loader._watcher.is_alive())
+        finally:
+            loader.watch = False
+
+
+class TestCompiledTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'cache')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(os.path.dirname(self.cache_dir))
+
+    def make_loader(self):
+        from genshi.filters import Translator
+        from pyramid_genshi import AssetTemplateLoader
+        return AssetTemplateLoader(
+            translator=Translator(),
+            cache_dir=self.cache_dir,
+        )
+
+    def test_load_compiled(self):
+        import mock
+        loader = self.make_loader()
+        tmpl = loader.load('tests:fixtures/asset_include.genshi')
+        expected = tmpl.generate().render()
+        self.assertIn('replaced', expected)
+        # asset_include and included
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        loader = self.make_loader()
+        with mock.patch.object(loader, '_instantiate') as instantiate:
+            tmpl = loader.load('tests:fixtures/asset_include.genshi')
+            self.assertEqual(tmpl.generate().render(), expected)
+        self.assertFalse(instantiate.called)
+        self.assertIs(tmpl.loader, loader)
+        self.assertIs(tmpl.filters[0], loader.translator)
+
+    def test_keyed_by_mtime_and_class(self):
+        from genshi.template import NewTextTemplate
+        from pyramid_genshi import CompiledTemplateCache
+        loader = self.make_loader()
+        cache = CompiledTemplateCache(self.cache_dir)
+        path = os.path.join(FIXTURES_DIR, 'minimal.txt')
+        tmpl = loader.load(path, cls=NewTextTemplate)
+        mtime = os.path.getmtime(path)
+        self.assertIsNotNone(
+            cache.get(NewTextTemplate, path, mtime, None, loader),
+        )
+        self.assertIsNone(
+            cache.get(NewTextTemplate, path, mtime + 1, None, loader),
+        )
+        self.assertIsNone(
+            cache.get(MarkupTemplate, path, mtime, None, loader),
+        )
+        self.assertEqual(tmpl.generate().render(), 'Hello, world.\n')
+
+    def test_broken_cache_file(self):
+        loader = self.make_loader()
+        loader.load('tests:fixtures/simple.genshi')
+        filename, = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, filename), 'wb') as cache_file:
+            cache_file.write(b'broken')
+
+        loader = self.make_loader()
+        tmpl = loader.load('tests:fixtures/simple.genshi')
+        self.assertEqual(tmpl.generate(name='foo').render('html'),
+                         '<div>\nfoo\n</div>')
+
+
+class TestFragmentCache(unittest.TestCase):
+
+    def make_loader(self, backend):
+        from pyramid_genshi import AssetTemplateLoader
+        from pyramid_genshi import FragmentCache
+        return AssetTemplateLoader(fragment_cache=FragmentCache(backend))
+
+    def render(self, loader, **kwargs):
+        values = dict(items=['a', 'b'], key='k', name='foo')
+        values.update(kwargs)
+        tmpl = loader.load('tests:fixtures/fragment.genshi')
+        return tmpl.generate(**values).render('html')
+
+    def test_cached(self):
+        from pyramid_genshi import MemoryFragmentCache
+        loader = self.make_loader(MemoryFragmentCache())
+        result = self.render(loader)
+        self.assertIn('<li>a</li><li>b</li></ul>', result)
+        self.assertIn('>foo</p>', result)
+
+        result = self.render(loader, items=['c'], name='bar')
+        self.assertIn('<li>a</li><li>b</li></ul>', result)
+        self.assertIn('>foo</p>', result)
+        # different key
+        result = self.render(loader, items=['c'], key='other', name='bar')
+        self.assertIn('<li>a</li><li>b</li></ul>', result)
+        self.assertIn('>bar</p>', result)
+        # None key disables caching
+        result = self.render(loader, key=None, name='eggs')
+        self.assertIn('>eggs</p>', result)
+
+    def test_disabled(self):
+        loader = self.make_loader(None)
+        self.render(loader)
+        result = self.render(loader, items=['c'], name='bar')
+        self.assertIn('<li>c</li></ul>', result)
+        self.assertIn('>bar</p>', result)
+
+    def test_ttl(self):
+        import time
+        import mock
+        from pyramid_genshi import MemoryFragmentCache
+        backend = MemoryFragmentCache()
+        loader = self.make_loader(backend)
+        self.render(loader)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            result = self.render(loader, items=['c'], name='bar')
+        # ul has no ttl, but p expires after 60 seconds
+        self.assertIn('<li>a</li><li>b</li></ul>', result)
+        self.assertIn('>bar</p>', result)
+
+    def test_preserved_whitespace(self):
+        from pyramid_genshi import MemoryFragmentCache
+        expected = [
+            '<pre>a\n\n\n  b   \n</pre>%s</div>',
+            '<textarea>%s\n\n\n  </textarea></div>',
+        ]
+        for auto_reload in [True, False]:
+            backend = MemoryFragmentCache()
+            loader = self.make_loader(backend)
+            loader.auto_reload = auto_reload
+            for name in ['foo', 'bar']:
+                tmpl = loader.load('tests:fixtures/fragment_pre.genshi')
+                result = tmpl.generate(name=name).render('html')
+                for text in expected:
+                    self.assertIn(text % name, result)
+            # whitespace of cached markup would not be preserved
+            self.assertEqual(len(backend._cache), 0)
+
+    def test_reloaded(self):
+        import time
+        import shutil
+        import tempfile
+        from pyramid_genshi import AssetTemplateLoader
+        from pyramid_genshi import FragmentCache
+        from pyramid_genshi import MemoryFragmentCache
+        tmp_dir = tempfile.mkdtemp()
+
+        def write(name, content, mtime):
+            path = os.path.join(tmp_dir, name)
+            with open(path, 'wt') as tmpl_file:
+                tmpl_file.write(content)
+            os.utime(path, (mtime, mtime))
+            return path
+
+        def write_page(text, mtime):
+            return write('page.genshi', (
+                '<div xmlns:xi="http://www.w3.org/2001/XInclude" '
+                'xmlns:cache="https://github.com/fangpenlin/pyramid_genshi/'
+                'cache"><div cache:fragment="\'nav\'"><p>%s</p>'
+                '<xi:include href="nav.genshi" /></div></div>'
+            ) % text, mtime)
+
+        def write_nav(text, mtime):
+            return write('nav.genshi', '<span>%s</span>' % text, mtime)
+
+        try:
+            now = time.time()
+            path = write_page('Page 1', now)
+            write_nav('Nav 1', now)
+            loader = AssetTemplateLoader(
+                auto_reload=True,
+                fragment_cache=FragmentCache(MemoryFragmentCache()),
+            )
+
+            def render():
+                return loader.load(path).generate().render('html')
+
+            self.assertEqual(render(), (
+                '<div><div><p>Page 1</p><span>Nav 1</span></div></div>'
+            ))
+            write_page('Page 2', now + 10)
+            self.assertEqual(render(), (
+                '<div><div><p>Page 2</p><span>Nav 1</span></div></div>'
+            ))
+            write_nav('Nav 2', now + 20)
+            self.assertEqual(render(), (
+                '<div><div><p>Page 2</p><span>Nav 2</span></div></div>'
+            ))
+            self.assertEqual(render(), (
+                '<div><div><p>Page 2</p><span>Nav 2</span></div></div>'
+            ))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_memory_lru(self):
+        from pyramid_genshi import MemoryFragmentCache
+        backend = MemoryFragmentCache(max_size=2)
+        backend.set('a', 'A')
+        backend.set('b', 'B')
+        self.assertEqual(backend.get('a'), 'A')
+        backend.set('c', 'C')
+        self.assertEqual(backend.get('a'), 'A')
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 'C')
+        backend.clear()
+        self.assertIsNone(backend.get('a'))
+
+    def test_from_settings(self):
+        from pyramid_genshi import FragmentCache
+        from pyramid_genshi import MemoryFragmentCache
+        fragment_cache = FragmentCache.from_settings({
+            'genshi.fragment_cache_size': '10',
+            'genshi.fragment_cache_ttl': '30',
+        })
+        self.assertIsInstance(fragment_cache.backend, MemoryFragmentCache)
+        self.assertEqual(fragment_cache.backend.max_size, 10)
+        self.assertEqual(fragment_cache.default_ttl, 30)
+        fragment_cache = FragmentCache.from_settings({
+            'genshi.fragment_cache': 'false',
+        })
+        self.assertIsNone(fragment_cache.backend)
+        fragment_cache = FragmentCache.from_settings({
+            'genshi.fragment_cache_backend':
+                'pyramid_genshi:MemoryFragmentCache',
+        })
+        self.assertIsInstance(fragment_cache.backend, MemoryFragmentCache)
+
+
+class TestFoldStatic(unittest.TestCase):
+
+    values = dict(
+        items=['a', '<b>'],
+        show=True,
+        cls='c',
+        strip=True,
+        name='bob',
+        empty='',
+    )
+
+    def make_loader(self, fold_static, i18n, auto_reload=True):
+        from genshi.filters import Translator
+        from pyramid_genshi import AssetTemplateLoader
+        from pyramid_genshi import ContextTranslator
+        from pyramid_genshi import TranslationStringAdaptor
+        if i18n:
+            translator = ContextTranslator(
+                TranslationStringAdaptor(lambda ts: ts.upper()),
+            )
+        else:
+            translator = Translator()
+        return AssetTemplateLoader(
+            translator=translator,
+            fold_static=fold_static,
+            auto_reload=auto_reload,
+        )
+
+    def render(self, loader, name, method):
+        from pyramid_genshi import RenderOptions
+        options = RenderOptions.from_settings({'genshi.method': method})
+        tmpl = loader.load('tests:fixtures/%s' % name)
+        values = dict(self.values)
+        values['_genshi.render_options'] = options
+        return ''.join(options.serializer(tmpl.generate(**values)))
+
+    def iter_folded(self, stream):
+        from genshi.template.base import EXPR
+        from genshi.template.base import SUB
+        from pyramid_genshi import StaticMarkup
+        for kind, data, pos in stream:
+            if kind is EXPR and isinstance(data, StaticMarkup):
+                yield data
+            elif kind is SUB:
+                for folded in self.iter_folded(data[1]):
+                    yield folded
+
+    def test_same_output(self):
+        for name in ['static.genshi', 'static_matched.genshi']:
+            for method in ['html', 'xhtml', 'xml']:
+                for i18n in [False, True]:
+                    for auto_reload in [False, True]:
+                        expected = self.render(
+                            self.make_loader(False, i18n, auto_reload),
+                            name, method,
+                        )
+                        self.assertEqual(
+                            self.render(
+                                self.make_loader(True, i18n, auto_reload),
+                                name, method,
+                            ),
+                            expected,
+                            (name, method, i18n, auto_reload),
+                        )
+
+    def test_folded(self):
+        loader = self.make_loader(True, False)
+        tmpl = loader.load('tests:fixtures/static.genshi')
+        self.assertTrue(len(list(self.iter_folded(tmpl.stream))) > 10)
+        loader = self.make_loader(False, False)
+        tmpl = loader.load('tests:fixtures/static.genshi')
+        self.assertEqual(list(self.iter_folded(tmpl.stream)), [])
+
+    def test_translatable_text_not_folded(self):
+        from genshi.core import TEXT
+        loader = self.make_loader(True, True)
+        tmpl = loader.load('tests:fixtures/static.genshi')
+        folded = list(self.iter_folded(tmpl.stream))
+        self.assertTrue(folded)
+        for static in folded:
+            for kind, data, pos in static.events:
+                if kind is TEXT:
+                    self.assertEqual(data.strip(), '')
+        result = self.render(loader, 'static.genshi', 'html')
+        self.assertIn('<h1>HEADER</h1>', result)
+        self.assertIn('alt="LOGO"', result)
+
+    def test_without_render_options(self):
+        loader = self.make_loader(True, False)
+        tmpl = loader.load('tests:fixtures/simple.genshi')
+        self.assertEqual(tmpl.generate(name='foo').render('html'),
+                         '<div>\nfoo\n</div>')
+
+
+class TestSkipUntranslatable(unittest.TestCase):
+
+    XMLNS = (
+        'xmlns:py="http://genshi.edgewall.org/" '
+        'xmlns:xi="http://www.w3.org/2001/XInclude" '
+        'xmlns:i18n="http://genshi.edgewall.org/i18n"'
+    )
+
+    def is_translatable(self, source, includes=True):
+        from genshi.filters import Translator
+        from pyramid_genshi import is_translatable
+        tmpl = MarkupTemplate(
+            '<div %s>%s</div>' % (self.XMLNS, source),
+            filepath=os.path.join(FIXTURES_DIR, 'inline.genshi'),
+        )
+        return is_translatable(tmpl._stream, Translator(), includes)
+
+    def test_is_translatable(self):
+        for source, expected in [
+            ('', False),
+            ('\n  <span>\n</span>', False),
+            ('<p>${name}</p><img alt="${name}" class="image" />', False),
+            ('<script>var text = "text";</script>', False),
+            ('<p xml:lang="en">English</p>', False),
+            ('<p>Text</p>', True),
+            ('<p py:if="x">Hello ${name}</p>', True),
+            ('<img alt="Logo" />', True),
+            ('<img alt="$$5" />', True),
+            ('<p i18n:msg="">${name}</p>', True),
+            ('<i18n:choose numeral="n" />', True),
+        ]:
+            self.assertEqual(self.is_translatable(source), expected, source)
+        include = '<xi:include href="included.genshi" />'
+        self.assertTrue(self.is_translatable(include))
+        self.assertFalse(self.is_translatable(include, includes=False))
+
+    def make_loader(self, skip, auto_reload=True):
+        from genshi.filters import Translator
+        from pyramid_genshi import AssetTemplateLoader
+        translator = Translator(lambda text: text.upper())
+        loader = AssetTemplateLoader(
+            translator=translator,
+            auto_reload=auto_reload,
+            skip_untranslatable=skip,
+        )
+        return loader, translator
+
+    def test_skipped(self):
+        loader, translator = self.make_loader(True)
+        tmpl = loader.load('tests:fixtures/simple.genshi')
+        self.assertNotIn(translator, tmpl.filters)
+        tmpl = loader.load('tests:fixtures/static_layout.genshi')
+        self.assertNotIn(translator, tmpl.filters)
+        tmpl = loader.load('tests:fixtures/i18n_msg.genshi')
+        self.assertIs(tmpl.filters[0], translator)
+
+        loader, translator = self.make_loader(False)
+        tmpl = loader.load('tests:fixtures/simple.genshi')
+        self.assertIs(tmpl.filters[0], translator)
+
+    def test_inlined_includes(self):
+        import shutil
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            page_path = os.path.join(tmp_dir, 'page.genshi')
+            with open(page_path, 'wt') as tmpl_file:
+                tmpl_file.write(
+                    '<div %s><xi:include href="part.genshi" />'
+                    '<p>${name}</p></div>' % self.XMLNS
+                )
+            with open(os.path.join(tmp_dir, 'part.genshi'), 'wt') as tmpl_file:
+                tmpl_file.write('<span>text</span>')
+            # included templates are inlined into the page without auto
+            # reloading, otherwise they are rendered with their own filters
+            for auto_reload in [True, False]:
+                loader, translator = self.make_loader(True, auto_reload)
+                tmpl = loader.load(page_path)
+                self.assertEqual(translator in tmpl.filters, not auto_reload)
+                self.assertEqual(
+                    tmpl.generate(name='foo').render('html'),
+                    '<div><span>TEXT</span><p>foo</p></div>',
+                )
+        finally:
+            shutil.rmtree(tmp_dir)
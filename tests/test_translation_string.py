@@ -98,3 +98,201 @@ class TestTranslationStringAdaptor(unittest.TestCase):
         self.assertEqual(msgid2, 'hello many babies')
         self.assertEqual(n, 5566)
         self.assertEqual(domain, 'MOCK_DOMAIN')
+
+    def test_gettext(self):
+        translate_calls = []
+
+        def mock_translate(ts):
+            translate_calls.append(ts)
+            return 'translated'
+
+        adaptor = self.make_one(
+            mock_translate,
+            default_domain='MOCK_DEFAULT_DOMAIN',
+        )
+        self.assertEqual(adaptor.gettext('hello baby'), 'translated')
+        self.assertEqual(adaptor.dgettext('MOCK_DOMAIN', 'hello baby'),
+                         'translated')
+
+        self.assertEqual(len(translate_calls), 2)
+        self.assertEqual(translate_calls[0].domain, 'MOCK_DEFAULT_DOMAIN')
+        self.assertEqual(translate_calls[1].domain, 'MOCK_DOMAIN')
+
+    def test_ngettext(self):
+        adaptor = self.make_one(lambda ts: ts)
+        ts = adaptor.ngettext('hello one baby', 'hello many babies', 5566)
+        self.assertEqual(ts, 'hello many babies')
+        ts = adaptor.dngettext('MOCK_DOMAIN', 'hello one baby',
+                               'hello many babies', 1)
+        self.assertEqual(ts, 'hello one baby')
+
+    def test_ugettext_cached(self):
+        from pyramid_genshi import TranslationCache
+        translate_calls = []
+
+        def mock_translate(ts):
+            translate_calls.append(ts)
+            return 'translated ' + ts
+
+        cache = TranslationCache()
+        adaptor = self.make_one(mock_translate, cache=cache, locale_name='es')
+        self.assertEqual(adaptor.ugettext('hello'), 'translated hello')
+        self.assertEqual(adaptor.ugettext('hello'), 'translated hello')
+        self.assertEqual(len(translate_calls), 1)
+        adaptor.ugettext('hello', domain='MOCK_DOMAIN')
+        self.assertEqual(len(translate_calls), 2)
+
+        adaptor = self.make_one(mock_translate, cache=cache, locale_name='fr')
+        adaptor.ugettext('hello')
+        self.assertEqual(len(translate_calls), 3)
+        self.assertEqual(cache.stats(), dict(size=3, hits=1, misses=3))
+
+    def test_ungettext_cached(self):
+        from pyramid_genshi import TranslationCache
+        pluralize_calls = []
+
+        def mock_pluralize(msgid1, msgid2, n, domain):
+            pluralize_calls.append((msgid1, msgid2, n, domain))
+            return msgid1 if n == 1 else msgid2
+
+        adaptor = self.make_one(lambda ts: ts, pluralize=mock_pluralize,
+                                cache=TranslationCache(), locale_name='es')
+        for _ in range(2):
+            self.assertEqual(adaptor.ungettext('baby', 'babies', 1), 'baby')
+            self.assertEqual(adaptor.ungettext('baby', 'babies', 2), 'babies')
+        self.assertEqual(len(pluralize_calls), 2)
+
+
+class DomainTranslations(object):
+    """Translations supports dugettext, like babel Translations
+
+    """
+
+    def dugettext(self, domain, message):
+        if message == 'same':
+            return message
+        return '%s:%s' % (domain, message.upper())
+
+
+class GettextTranslations(object):
+
+    def ugettext(self, message):
+        return message.upper()
+    gettext = ugettext
+
+
+class TestMakePlainTranslate(unittest.TestCase):
+
+    def make_localizer(self, translations):
+        from pyramid.i18n import Localizer
+        return Localizer('xx', translations)
+
+    def test_same_as_translate(self):
+        from pyramid.i18n import TranslationString
+        from pyramid_genshi import make_plain_translate
+        for translations in [
+            DomainTranslations(), GettextTranslations(), None,
+        ]:
+            localizer = self.make_localizer(translations)
+            plain_translate = make_plain_translate(localizer)
+            for msgid in ['hello', 'same', 'Hello ${name}', '']:
+                for domain in [None, 'MOCK_DOMAIN']:
+                    expected = localizer.translate(
+                        TranslationString(msgid, domain=domain),
+                    )
+                    result = plain_translate(msgid, domain)
+                    self.assertEqual(result, expected)
+                    self.assertIs(type(result), type(expected))
+
+    def test_not_supported(self):
+        import mock
+        from pyramid.i18n import Localizer
+        from pyramid_genshi import make_plain_translate
+        self.assertIsNone(make_plain_translate(None))
+
+        class CustomLocalizer(Localizer):
+            def translate(self, tstring, domain=None, mapping=None):
+                return 'custom'
+        self.assertIsNone(make_plain_translate(
+            CustomLocalizer('xx', GettextTranslations()),
+        ))
+        with mock.patch('pyramid.i18n.Localizer.translate'):
+            self.assertIsNone(make_plain_translate(
+                self.make_localizer(GettextTranslations()),
+            ))
+
+    def test_adaptor(self):
+        from pyramid_genshi import make_plain_translate
+        translate_calls = []
+
+        def mock_translate(ts):
+            translate_calls.append(ts)
+
+        localizer = self.make_localizer(DomainTranslations())
+        adaptor = TranslationStringAdaptor(
+            mock_translate,
+            default_domain='MOCK_DEFAULT_DOMAIN',
+            plain_translate=make_plain_translate(localizer),
+        )
+        self.assertEqual(adaptor.ugettext('hello'),
+                         'MOCK_DEFAULT_DOMAIN:HELLO')
+        self.assertEqual(adaptor.dugettext('MOCK_DOMAIN', 'hello'),
+                         'MOCK_DOMAIN:HELLO')
+        self.assertEqual(translate_calls, [])
+
+    def test_renderer_translate(self):
+        from pyramid_genshi import GenshiTemplateRenderer
+        renderer = GenshiTemplateRenderer(
+            'tests:fixtures/minimal.genshi', settings={},
+        )
+        localizer = self.make_localizer(DomainTranslations())
+        translate = renderer.make_translate(localizer)
+        self.assertEqual(translate('hello'), 'messages:HELLO')
+        self.assertEqual(translate('hello', domain='MOCK_DOMAIN'),
+                         'MOCK_DOMAIN:HELLO')
+        self.assertEqual(
+            translate('Hello ${name}', mapping=dict(name='foo')),
+            'messages:HELLO ${NAME}',
+        )
+
+
+class TestTranslationCache(unittest.TestCase):
+    def make_one(self, *args, **kwargs):
+        from pyramid_genshi import TranslationCache
+        return TranslationCache(*args, **kwargs)
+
+    def make_localizer(self, locale_name):
+        from pyramid.i18n import Localizer
+        return Localizer(locale_name, object())
+
+    def test_max_size(self):
+        cache = self.make_one(max_size=2)
+        cache.set(('es', None, 'a'), 'A')
+        cache.set(('es', None, 'b'), 'B')
+        cache.set(('es', None, 'c'), 'C')
+        self.assertEqual(cache.get(('es', None, 'a')), None)
+        self.assertEqual(cache.get(('es', None, 'c')), 'C')
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_invalidate(self):
+        cache = self.make_one()
+        cache.set(('es', None, 'a'), 'A')
+        cache.set(('fr', None, 'a'), 'A')
+        cache.invalidate('es')
+        self.assertEqual(cache.get(('es', None, 'a')), None)
+        self.assertEqual(cache.get(('fr', None, 'a')), 'A')
+        cache.invalidate()
+        self.assertEqual(cache.get(('fr', None, 'a')), None)
+
+    def test_bind_catalog_replaced(self):
+        cache = self.make_one()
+        localizer = self.make_localizer('es')
+        cache.bind(localizer)
+        cache.set(('es', None, 'a'), 'A')
+        cache.set(('fr', None, 'a'), 'A')
+        cache.bind(localizer)
+        self.assertEqual(cache.get(('es', None, 'a')), 'A')
+
+        cache.bind(self.make_localizer('es'))
+        self.assertEqual(cache.get(('es', None, 'a')), None)
+        self.assertEqual(cache.get(('fr', None, 'a')), 'A')